@@ -0,0 +1,81 @@
+"""
+Баланс классов: матрица побед «каждый против каждого» на уровнях по Монте-Карло (services/simulator.py).
+
+Боец уровня L — все 5*(L-1) очков в основной стат класса (Ловкач — AGI, Танк — STA, Мастер — STR; --build even —
+поровну в STR/AGI/INT/STA) и лучшее доступное снаряжение из _INITIAL_ITEMS. Зоны — как «Автобой» (равномерно).
+Нужен numpy (в зависимости бота не входит).
+
+    python -m benchmarks.balance --levels 1,3,5 --fights 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import _INITIAL_ITEMS  # noqa: E402
+from services.simulator import best_loadout, fighter, win_matrix  # noqa: E402
+
+CLASSES = {"rogue": "Ловкач", "tank": "Танк", "warrior": "Мастер"}
+MAIN_STAT = {"rogue": "agility", "tank": "stamina", "warrior": "strength"}
+STATS = ("strength", "agility", "intuition", "stamina")
+
+
+def build_fighter(player_class: str, level: int, build: str) -> dict:
+    points = 5 * (level - 1)
+    stats = {s: 1 for s in STATS}
+    if build == "even":
+        for k in range(points):
+            stats[STATS[k % len(STATS)]] += 1
+    else:
+        stats[MAIN_STAT[player_class]] += points
+    return fighter(player_class, level, best_loadout(_INITIAL_ITEMS, player_class, level), **stats)
+
+
+def run(levels: list[int], fights: int, build: str, seed: int) -> list[dict]:
+    results = []
+    for level in levels:
+        fighters = {cls: build_fighter(cls, level, build) for cls in CLASSES}
+        t0 = time.perf_counter()
+        matrix = win_matrix(fighters, fights, seed=seed + level)
+        elapsed = round(time.perf_counter() - t0, 2)
+        results.append({
+            "level": level,
+            "build": build,
+            "fights": fights,
+            "elapsed_s": elapsed,
+            "fighters": fighters,
+            "matrix": {
+                a: {b: {k: v for k, v in rep.items() if not k.endswith("_hist")} for b, rep in row.items()}
+                for a, row in matrix.items()
+            },
+        })
+        print(f"\n== Уровень {level} ({build}, {fights} боёв на пару, {elapsed} с)")
+        print("  " + " " * 10 + "".join(f"{CLASSES[b]:>16}" for b in CLASSES))
+        for a, row in matrix.items():
+            cells = "".join(
+                f"{row[b]['p1_win_rate']:>9.1%} ({row[b]['rounds_mean']:>4.1f})" for b in CLASSES
+            )
+            print(f"  {CLASSES[a]:<10}{cells}")
+        print("  победы первого (средняя длина боя в раундах); первый проигрывает при двойном нокауте")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,3,5", help="уровни через запятую")
+    parser.add_argument("--fights", type=int, default=200_000, help="боёв на каждую пару классов")
+    parser.add_argument("--build", choices=("main", "even"), default="main")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    results = run([int(x) for x in args.levels.split(",")], args.fights, args.build, args.seed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
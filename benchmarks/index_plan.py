@@ -0,0 +1,188 @@
+"""
+Замер индексного плана: латентность горячих запросов Database при росте числа игроков и боёв.
+
+Создаёт отдельную схему (по умолчанию bench_idx) в БД из DB_URL, поднимает в ней таблицы и индексы
+через Database.init(), наполняет синтетикой ступенями и на каждой ступени замеряет методы Database
+(среднее и p95 по случайным игрокам) + план запроса из EXPLAIN. Плоские цифры между ступенями
+означают, что запрос идёт по индексу, а не по таблице.
+
+    python -m benchmarks.index_plan --scales 10000:100000,100000:1000000,1000000:10000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+import asyncpg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import Database, _init_connection  # noqa: E402
+
+load_dotenv()
+
+SAMPLES = 200
+
+
+async def _seed(conn, players_from: int, players_to: int, battles_from: int, battles_to: int) -> None:
+    """Догрузить игроков (players_from, players_to] и боёв (battles_from, battles_to]."""
+    if players_to > players_from:
+        await conn.execute(
+            """
+            INSERT INTO players (telegram_id, username, player_class)
+            SELECT g, 'p' || g, (ARRAY['rogue', 'tank', 'warrior', NULL])[1 + g % 4]
+            FROM generate_series($1::int + 1, $2::int) g
+            """,
+            players_from, players_to,
+        )
+        await conn.execute(
+            """
+            INSERT INTO player_stats (player_id, level, experience, credits)
+            SELECT g, 1 + (random() * 30)::int, (random() * 10000)::int, (random() * 1000)::int
+            FROM generate_series($1::int + 1, $2::int) g
+            """,
+            players_from, players_to,
+        )
+        await conn.execute(
+            """
+            INSERT INTO inventory (player_id, item_id, is_equipped)
+            SELECT g, i.ids[1 + (g * 7 + k) % array_length(i.ids, 1)], k < 3
+            FROM generate_series($1::int + 1, $2::int) g
+            CROSS JOIN generate_series(0, 4) k
+            CROSS JOIN (SELECT array_agg(id) AS ids FROM items WHERE slot <> 'potion') i
+            """,
+            players_from, players_to,
+        )
+    if battles_to > battles_from:
+        # 0.1% боёв не завершены
+        await conn.execute(
+            """
+            INSERT INTO battles (player1_id, player2_id, player1_hp, player2_hp, is_finished, created_at, winner_id)
+            SELECT 1 + (g % $3::int), 1 + ((g * 7919 + 1) % $3::int), 50, 0,
+                   g % 1000 <> 0, NOW() - (g % 86400) * INTERVAL '1 second', 1 + (g % $3::int)
+            FROM generate_series($1::int + 1, $2::int) g
+            """,
+            battles_from, battles_to, players_to,
+        )
+        await conn.execute(
+            """
+            INSERT INTO shadow_fights (player_id, shadow_hp, player_hp, round, is_finished)
+            SELECT 1 + (g % $3::int), 0, 10, 5, g % 1000 <> 0
+            FROM generate_series($1::int / 2 + 1, $2::int / 2) g
+            """,
+            battles_from, battles_to, players_to,
+        )
+    await conn.execute("ANALYZE")
+
+
+async def _measure(name: str, fn, ids: list[int]) -> dict:
+    times = []
+    for pid in ids:
+        t0 = time.perf_counter()
+        await fn(pid)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {
+        "query": name,
+        "mean_ms": round(statistics.fmean(times), 3),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1], 3),
+    }
+
+
+async def _plan(conn, sql: str, *args) -> str:
+    rows = await conn.fetch("EXPLAIN " + sql, *args)
+    return " | ".join(r[0].strip() for r in rows[:3])
+
+
+async def run(scales: list[tuple[int, int]], schema: str, keep: bool) -> list[dict]:
+    dsn = os.getenv("DB_URL", "").strip().replace("postgresql+asyncpg://", "postgresql://", 1)
+    if not dsn:
+        raise SystemExit("Set DB_URL in .env")
+    admin = await asyncpg.connect(dsn)
+    await admin.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    db = Database()
+    db.stats_cache.maxsize = 0  # мерим БД, а не кэш
+    db._pool = await asyncpg.create_pool(
+        dsn=dsn, min_size=1, max_size=4, command_timeout=3600,
+        server_settings={"search_path": schema}, init=_init_connection,
+    )
+    results = []
+    try:
+        await db.init()
+        prev_p, prev_b = 0, 0
+        for n_players, n_battles in scales:
+            t0 = time.perf_counter()
+            async with db.pool.acquire() as conn:
+                await _seed(conn, prev_p, n_players, prev_b, n_battles)
+                plans = {
+                    "active_battle": await _plan(
+                        conn,
+                        "SELECT id FROM battles WHERE (player1_id = $1 OR player2_id = $1) AND is_finished = FALSE",
+                        1,
+                    ),
+                    "active_shadow": await _plan(
+                        conn,
+                        "SELECT id FROM shadow_fights WHERE player_id = $1 AND is_finished = FALSE ORDER BY id DESC LIMIT 1",
+                        1,
+                    ),
+                    "leaderboard": await _plan(
+                        conn, "SELECT player_id FROM player_stats ORDER BY level DESC, experience DESC LIMIT 100"
+                    ),
+                }
+            prev_p, prev_b = n_players, n_battles
+            await db.load_rank_index()
+            seed_s = round(time.perf_counter() - t0, 1)
+            ids = [random.randint(1, n_players) for _ in range(SAMPLES)]
+            step = {"players": n_players, "battles": n_battles, "seed_s": seed_s, "plans": plans, "queries": []}
+            step["queries"].append(await _measure("get_active_battle_for_player", db.get_active_battle_for_player, ids))
+            step["queries"].append(await _measure("get_active_shadow_fight", db.get_active_shadow_fight, ids))
+            step["queries"].append(await _measure("get_combat_stats", db.get_combat_stats, ids))
+            step["queries"].append(await _measure("get_leaderboard(100)", lambda _: db.get_leaderboard(100), ids[:50]))
+            step["queries"].append(
+                await _measure("get_board_rows(level, 100)", lambda _: db.get_board_rows("level", 100), ids[:50])
+            )
+            step["queries"].append(await _measure("get_user_rank", db.get_user_rank, ids))
+            results.append(step)
+            print(f"\n== {n_players} игроков, {n_battles} боёв (наполнение {seed_s} с)")
+            for q in step["queries"]:
+                print(f"  {q['query']:<32} mean {q['mean_ms']:>8} ms   p95 {q['p95_ms']:>8} ms")
+            for k, v in plans.items():
+                print(f"  plan {k}: {v}")
+    finally:
+        await db.close()
+        if not keep:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await admin.close()
+    return results
+
+
+def _parse_scales(text: str) -> list[tuple[int, int]]:
+    out = []
+    for part in text.split(","):
+        players, battles = part.split(":")
+        out.append((int(players), int(battles)))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000:100000,100000:1000000,1000000:10000000",
+                        help="ступени игроки:бои через запятую (по возрастанию)")
+    parser.add_argument("--schema", default="bench_idx")
+    parser.add_argument("--keep", action="store_true", help="не удалять схему после замера")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    results = asyncio.run(run(_parse_scales(args.scales), args.schema, args.keep))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
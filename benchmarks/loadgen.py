@@ -0,0 +1,455 @@
+"""
+Нагрузочный прогон бота: тысячи виртуальных игроков шлют апдейты в настоящий Dispatcher (main.build_dispatcher —
+все роутеры и middleware), ответы уходят в Bot с записывающей сессией вместо Telegram.
+
+Сценарий игрока: /start → /shop → оружие 1 ур. → карточка → покупка → /shadow → бой с Тенью на «Автобое» →
+/arena → «Найти соперника» → бой на «Автобое» (раунд ждёт итога от подписчика событий, как живой игрок).
+Между действиями — пауза до --think сек. Ступени --levels — сколько игроков действуют одновременно;
+на каждой ступени игроки новые (регистрация включена в замер); после /start игроку начисляется --credits кр.
+напрямую в БД (вне замера) — иначе новичку не на что купить оружие и поставить на арене.
+
+Отчёт по ступени: апдейтов/сек, латентность обработки апдейта (feed_update: middleware + хендлер + ожидание
+отправки через services/sender.py) p50/p99, ожидание соединения из пула asyncpg p50/p99, ошибки хендлеров,
+исходящие вызовы по методам Bot API. Ступень, где p99 > --slo или есть ошибки, помечается — там бот «падает».
+
+БД — отдельная схема (по умолчанию bench_load) в DB_URL, как у benchmarks/index_plan.py. Лимиты Telegram
+в очереди отправки по умолчанию сняты (сессия-заглушка отвечает сразу); --real-limits оставляет их из .env,
+--api-latency добавляет задержку «сети» к каждому вызову Bot API.
+
+    python -m benchmarks.loadgen --levels 50,200,1000,3000 --json bench/load.json
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Первый telegram_id виртуальных игроков (вне диапазона настоящих id)
+TG_BASE = 9_000_000_000
+BOT_ID = 123456
+
+_END_MARKERS = ("ПОБЕДА", "ПОРАЖЕНИЕ", "сдачей")
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 3)
+
+
+class _Chat:
+    __slots__ = ("text", "message_id", "changed")
+
+    def __init__(self):
+        self.text = ""
+        self.message_id = 0
+        self.changed = asyncio.Event()
+
+
+class _TimedAcquire:
+    """pool.acquire() с замером ожидания соединения; работает и как `async with`, и как `await`."""
+
+    __slots__ = ("_owner", "_timeout", "_conn")
+
+    def __init__(self, owner: "_TimedPool", timeout: Optional[float]):
+        self._owner = owner
+        self._timeout = timeout
+        self._conn = None
+
+    async def _acquire(self):
+        t0 = time.perf_counter()
+        conn = await self._owner.pool.acquire(timeout=self._timeout)
+        self._owner.waits.append((time.perf_counter() - t0) * 1000)
+        return conn
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        return self._conn
+
+    async def __aexit__(self, *exc) -> None:
+        await self._owner.pool.release(self._conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class _TimedPool:
+    """Обёртка пула asyncpg для Database._pool: остальные методы — как у пула."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.waits: list[float] = []
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self, timeout)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+
+def _recording_session_cls():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendMessage
+    from aiogram.types import Message
+
+    class RecordingSession(BaseSession):
+        """Сессия Bot без сети: считает вызовы по методам, помнит последний текст и id сообщения в каждом чате."""
+
+        def __init__(self, latency: float = 0.0):
+            super().__init__()
+            self.latency = latency
+            self.calls: dict[str, int] = {}
+            self.chats: dict[int, _Chat] = {}
+            self._message_ids = itertools.count(1)
+
+        def chat(self, chat_id: int) -> _Chat:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                chat = self.chats[chat_id] = _Chat()
+            return chat
+
+        def _record(self, chat_id: int, text: str, message_id: int) -> None:
+            chat = self.chat(chat_id)
+            chat.text = text
+            chat.message_id = message_id
+            chat.changed.set()
+
+        async def make_request(self, bot, method, timeout: Optional[int] = None) -> Any:
+            name = type(method).__name__
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if isinstance(method, SendMessage):
+                message_id = next(self._message_ids)
+                self._record(method.chat_id, method.text, message_id)
+                return Message.model_validate(
+                    {
+                        "message_id": message_id,
+                        "date": int(time.time()),
+                        "chat": {"id": method.chat_id, "type": "private"},
+                        "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                        "text": method.text,
+                    },
+                    context={"bot": bot},
+                )
+            if isinstance(method, EditMessageText):
+                self._record(method.chat_id, method.text, method.message_id)
+            # edit/delete/answerCallbackQuery — True, как у Telegram
+            return True
+
+        async def close(self) -> None:
+            pass
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            # Файлы в прогоне не скачиваются — пустой поток
+            for chunk in ():
+                yield chunk
+
+    return RecordingSession
+
+
+class VirtualPlayer:
+    """Один игрок: апдейты от его имени и ожидание ответов бота в его чате."""
+
+    def __init__(self, run: "LoadRun", telegram_id: int):
+        self.run = run
+        self.tg = telegram_id
+        self.user = {"id": telegram_id, "is_bot": False, "first_name": f"v{telegram_id % 1_000_000}",
+                     "username": f"v{telegram_id % 1_000_000}"}
+        self.chat = run.session.chat(telegram_id)
+
+    async def _think(self) -> None:
+        if self.run.think:
+            await asyncio.sleep(random.uniform(0, self.run.think))
+
+    async def message(self, text: str) -> None:
+        await self._think()
+        await self.run.feed({
+            "message": {
+                "message_id": next(self.run.update_ids),
+                "date": int(time.time()),
+                "chat": {"id": self.tg, "type": "private"},
+                "from": self.user,
+                "text": text,
+            },
+        })
+
+    async def press(self, data: str) -> None:
+        """Нажатие кнопки на последнем сообщении бота в чате."""
+        await self._think()
+        await self.run.feed({
+            "callback_query": {
+                "id": str(next(self.run.update_ids)),
+                "from": self.user,
+                "chat_instance": str(self.tg),
+                "data": data,
+                "message": {
+                    "message_id": self.chat.message_id or 1,
+                    "date": int(time.time()),
+                    "chat": {"id": self.tg, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                    "text": self.chat.text or "-",
+                },
+            },
+        })
+
+    async def wait_for(self, predicate: Callable[[str], bool], timeout: float) -> bool:
+        """Ждать, пока последний текст бота в чате не удовлетворит predicate (ответ мог прийти событием)."""
+        deadline = time.monotonic() + timeout
+        while not predicate(self.chat.text):
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            self.chat.changed.clear()
+            try:
+                await asyncio.wait_for(self.chat.changed.wait(), left)
+            except asyncio.TimeoutError:
+                return predicate(self.chat.text)
+        return True
+
+    async def script(self) -> None:
+        await self.message("/start")
+        await self.run.grant_credits(self.tg)
+
+        await self.message("/shop")
+        await self.press("shop_cat:weapons:lvl:1")
+        if self.run.shop_item_id:
+            await self.press(f"shop_item_{self.run.shop_item_id}")
+            await self.press(f"shop_buy_{self.run.shop_item_id}")
+
+        await self.message("/shadow")
+        await self.press("shadow_start")
+        for _ in range(40):
+            await self.press("shadow_auto")
+            if any(m in self.chat.text for m in _END_MARKERS) or "Нет активного боя" in self.chat.text:
+                break
+
+        await self.message("/arena")
+        await self.press("arena_find")
+        started = await self.wait_for(lambda t: "ачался" in t, self.run.arena_wait)
+        if not started:
+            self.run.arena_timeouts += 1
+            await self.press("arena_leave")
+            return
+        for round_number in range(1, 60):
+            await self.press("move_auto")
+            done = await self.wait_for(
+                lambda t: f"Раунд {round_number}<" in t or any(m in t for m in _END_MARKERS), self.run.arena_wait,
+            )
+            if any(m in self.chat.text for m in _END_MARKERS):
+                self.run.arena_finished += 1
+                return
+            if not done:
+                break
+        self.run.arena_timeouts += 1
+        await self.press("surrender_confirm")
+
+
+class LoadRun:
+    def __init__(
+        self, dp, bot, session, think: float, arena_wait: float, shop_item_id: Optional[int], credits: int,
+    ):
+        from aiogram.types import Update
+
+        self._update_cls = Update
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.think = think
+        self.arena_wait = arena_wait
+        self.shop_item_id = shop_item_id
+        self.credits = credits
+        self.update_ids = itertools.count(1)
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.error_samples: list[str] = []
+        self.arena_finished = 0
+        self.arena_timeouts = 0
+
+    async def grant_credits(self, telegram_id: int) -> None:
+        """Стартовый баланс (у нового игрока 0 кр. — без него не купить и не поставить на арене); вне замера."""
+        from database.db import db
+
+        player = await db.get_player_by_telegram_id(telegram_id)
+        if player and self.credits:
+            await db.add_credits(player["id"], self.credits)
+
+    async def feed(self, payload: dict) -> None:
+        update = self._update_cls.model_validate(
+            {"update_id": next(self.update_ids), **payload}, context={"bot": self.bot},
+        )
+        t0 = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(f"{type(e).__name__}: {e}")
+        finally:
+            self.latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def _run_level(
+    dp, bot, session, pool: _TimedPool, players: int, first_tg: int, args, shop_item_id: Optional[int],
+) -> dict:
+    from services.sender import sender
+
+    run = LoadRun(dp, bot, session, args.think, args.arena_wait, shop_item_id, args.credits)
+    pool.waits.clear()
+    calls_before = dict(session.calls)
+    sent_before = sender.stats()
+    t0 = time.perf_counter()
+    results = await asyncio.gather(
+        *(VirtualPlayer(run, first_tg + i).script() for i in range(players)), return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - t0
+    crashed = [r for r in results if isinstance(r, BaseException)]
+    after = sender.stats()
+    return {
+        "players": players,
+        "elapsed_s": round(elapsed, 2),
+        "updates": len(run.latencies),
+        "updates_per_s": round(len(run.latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(run.latencies), 3) if run.latencies else 0.0,
+            "p50": _pct(run.latencies, 0.50),
+            "p99": _pct(run.latencies, 0.99),
+            "max": round(max(run.latencies), 3) if run.latencies else 0.0,
+        },
+        "pool_wait_ms": {
+            "acquires": len(pool.waits),
+            "p50": _pct(pool.waits, 0.50),
+            "p99": _pct(pool.waits, 0.99),
+            "max": round(max(pool.waits), 3) if pool.waits else 0.0,
+        },
+        "errors": run.errors + len(crashed),
+        "error_samples": run.error_samples + [f"{type(e).__name__}: {e}" for e in crashed[:3]],
+        "arena_finished": run.arena_finished,
+        "arena_timeouts": run.arena_timeouts,
+        "bot_calls": {k: v - calls_before.get(k, 0) for k, v in session.calls.items() if v - calls_before.get(k, 0)},
+        "sender": {k: after[k] - sent_before.get(k, 0) for k in ("sent", "edited", "coalesced", "failed")},
+    }
+
+
+async def run(args) -> list[dict]:
+    import asyncpg
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+
+    from database.db import _init_connection
+    from main import build_dispatcher, db, arena
+
+    # main настраивает INFO-логи для бота; в прогоне они только мешают отчёту
+    logging.getLogger().setLevel(logging.WARNING)
+    from services.matchmaking import Matchmaker
+    from services.sender import sender
+
+    dsn = os.getenv("DB_URL", "").strip().replace("postgresql+asyncpg://", "postgresql://", 1)
+    if not dsn:
+        raise SystemExit("Set DB_URL in .env")
+    admin = await asyncpg.connect(dsn)
+    await admin.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {args.schema}")
+
+    session = _recording_session_cls()(latency=args.api_latency / 1000)
+    bot = Bot(token=f"{BOT_ID}:LOADGEN", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = build_dispatcher()
+    arena.subscribe_events(db.events)
+
+    pool = _TimedPool(await asyncpg.create_pool(
+        dsn=dsn, min_size=1, max_size=args.pool_size, command_timeout=60,
+        server_settings={"search_path": args.schema}, init=_init_connection,
+    ))
+    db._pool = pool
+    matchmaker = None
+    results = []
+    try:
+        await db.init()
+        await db.load_rank_index()
+        if db.fight_registry_enabled:
+            await db.load_fight_registry()
+        await sender.start(bot)
+        if args.matchmaker:
+            matchmaker = Matchmaker(db, fair=True)
+            await matchmaker.start()
+            dp["matchmaker"] = matchmaker
+        weapons = [i for i in db.catalog.all() if i["slot"] == "weapon" and (i.get("min_level") or 1) == 1]
+        shop_item_id = weapons[0]["id"] if weapons else None
+
+        first_tg = TG_BASE
+        for players in args.levels:
+            step = await _run_level(dp, bot, session, pool, players, first_tg, args, shop_item_id)
+            first_tg += players
+            step["over_slo"] = step["latency_ms"]["p99"] > args.slo or step["errors"] > 0
+            results.append(step)
+            lat, wait = step["latency_ms"], step["pool_wait_ms"]
+            print(
+                f"\n== {players} игроков: {step['updates']} апдейтов за {step['elapsed_s']} с "
+                f"({step['updates_per_s']}/с){'  ❗ выше SLO' if step['over_slo'] else ''}"
+            )
+            print(f"  обработка апдейта: p50 {lat['p50']} ms, p99 {lat['p99']} ms, max {lat['max']} ms")
+            print(f"  ожидание пула ({wait['acquires']}): p50 {wait['p50']} ms, p99 {wait['p99']} ms, max {wait['max']} ms")
+            print(f"  арена: {step['arena_finished']} боёв до конца, {step['arena_timeouts']} без соперника/по таймауту")
+            print(f"  Bot API: {step['bot_calls']}")
+            if step["errors"]:
+                print(f"  ошибки: {step['errors']}  {step['error_samples']}")
+    finally:
+        if matchmaker:
+            await matchmaker.stop()
+        await db.events.stop()
+        await sender.stop()
+        await db.close()
+        await bot.session.close()
+        if not args.keep:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        await admin.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="50,200,1000", help="одновременных игроков на ступенях, через запятую")
+    parser.add_argument("--think", type=float, default=0.2, help="пауза игрока между действиями, до N сек")
+    parser.add_argument("--arena-wait", type=float, default=15.0, help="сколько игрок ждёт соперника / итога раунда, сек")
+    parser.add_argument("--credits", type=int, default=100, help="стартовый баланс игрока после /start")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка каждого вызова Bot API, мс")
+    parser.add_argument("--pool-size", type=int, default=10, help="max_size пула asyncpg (как в Database.connect)")
+    parser.add_argument("--slo", type=float, default=1000.0, help="порог p99 обработки апдейта, мс")
+    parser.add_argument("--matchmaker", action="store_true", help="подбор через services/matchmaking.py")
+    parser.add_argument("--real-limits", action="store_true", help="оставить лимиты Telegram в очереди отправки")
+    parser.add_argument("--schema", default="bench_load")
+    parser.add_argument("--keep", action="store_true", help="не удалять схему после прогона")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    args.levels = [int(x) for x in args.levels.split(",") if x]
+    if not args.real_limits:
+        # До импорта services.sender: очередь читает лимиты из окружения при создании
+        for key in ("SEND_GLOBAL_RATE", "SEND_CHAT_RATE", "SEND_CHAT_BURST"):
+            os.environ[key] = "1000000"
+        os.environ["SEND_MAX_IN_FLIGHT"] = "1000"
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {"time": datetime.datetime.now().isoformat(timespec="seconds"), **{
+            k: v for k, v in vars(args).items() if k != "json"
+        }},
+        "levels": results,
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
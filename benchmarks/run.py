@@ -0,0 +1,376 @@
+"""
+Набор бенчмарков с сохранением в JSON и сравнением двух прогонов (например, до и после коммита).
+
+Группы:
+- math   — BattleMath.resolve_round (глобальный random и поток services/rng.py), таблица win_solver (с numpy);
+- render — draw_hp_bar арены и Тени, клавиатуры хода и магазина (нужен aiogram);
+- db     — латентность методов Database на синтетике в отдельной схеме (как benchmarks/index_plan.py):
+           чтения по случайным игрокам, покупка/продажа, бой с Тенью и бой арены целиком. Кэши отключены.
+
+Каждый замер — время одного вызова в мкс: mean, p50, p99 и вызовов/сек.
+
+    python -m benchmarks.run --groups math,render,db --json bench/HEAD.json
+    python -m benchmarks.run compare bench/base.json bench/HEAD.json --threshold 0.2
+
+compare сравнивает p50 и завершается с кодом 1, если какой-то замер медленнее базы больше чем на threshold.
+Микробенчмарки на виртуалке шумят на 10–20%: сравнивать прогоны с одной машины, порог — не ниже 0.2.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GROUPS = ("math", "render", "db")
+
+# Типичные бойцы 3 уровня (Мастер с мечом против Танка в полном сете) — как их снапшоты в battles
+FIGHTER_1 = {
+    "strength": 11, "agility": 1, "intuition": 1, "stamina": 1, "level": 3, "hp": 50, "max_hp": 50,
+    "weapon_min": 29, "weapon_max": 34, "armor": 6, "crit_bonus": 0.0, "block_bonus": 11.0,
+}
+FIGHTER_2 = {
+    "strength": 1, "agility": 1, "intuition": 1, "stamina": 11, "level": 3, "hp": 210, "max_hp": 210,
+    "weapon_min": 7, "weapon_max": 12, "armor": 20, "crit_bonus": 0.0, "block_bonus": 0.0,
+}
+
+
+def _summary(times_us: list[float]) -> dict:
+    times_us = sorted(times_us)
+    n = len(times_us)
+    mean = statistics.fmean(times_us)
+    return {
+        "n": n,
+        "mean_us": round(mean, 3),
+        "p50_us": round(times_us[n // 2], 3),
+        "p99_us": round(times_us[min(n - 1, int(n * 0.99))], 3),
+        "ops_s": round(1e6 / mean, 1) if mean else 0.0,
+    }
+
+
+def _bench(fn: Callable[[], object], number: int, repeat: int = 20) -> dict:
+    """repeat серий по number вызовов; в выборке — среднее время вызова в серии (мелкие функции)."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number * 1e6)
+    return _summary(samples)
+
+
+class _AsyncTimer:
+    """Время каждого await по имени метода: `await timer("get_battle", db.get_battle(bid))`."""
+
+    def __init__(self):
+        self.times: dict[str, list[float]] = {}
+
+    async def __call__(self, name: str, awaitable):
+        t0 = time.perf_counter()
+        result = await awaitable
+        self.times.setdefault(name, []).append((time.perf_counter() - t0) * 1e6)
+        return result
+
+    def results(self, prefix: str) -> dict[str, dict]:
+        return {f"{prefix}.{name}": _summary(times) for name, times in self.times.items()}
+
+
+# ----- math -----
+def bench_math(scale: float) -> dict[str, dict]:
+    from services.game_math import BattleMath
+    from services.rng import combat_rng, np
+    from services.win_solver import solve_table
+
+    number = max(1, int(2000 * scale))
+    zones = [(random.randint(1, 3), random.randint(1, 3), random.randint(1, 3), random.randint(1, 3)) for _ in range(64)]
+    it = iter(range(1 << 62))
+
+    def round_global():
+        z = zones[next(it) & 63]
+        BattleMath.resolve_round(FIGHTER_1, FIGHTER_2, *z)
+
+    def round_stream(backend: str):
+        def run():
+            k = next(it)
+            BattleMath.resolve_round(FIGHTER_1, FIGHTER_2, *zones[k & 63], rng=combat_rng(42, k, backend=backend))
+        return run
+
+    out = {
+        "math.resolve_round": _bench(round_global, number),
+        "math.resolve_round_seeded": _bench(round_stream("python"), number),
+    }
+    if np is not None:
+        out["math.resolve_round_seeded_numpy"] = _bench(round_stream("numpy"), number)
+        out["math.win_table"] = _bench(
+            lambda: solve_table(FIGHTER_1, FIGHTER_2, FIGHTER_1["max_hp"], FIGHTER_2["max_hp"]), max(1, int(5 * scale)), 5,
+        )
+    return out
+
+
+# ----- render -----
+def bench_render(scale: float) -> dict[str, dict]:
+    from database.db import _INITIAL_ITEMS
+    from handlers.arena import draw_hp_bar as arena_hp_bar
+    from handlers.shadow_fight import draw_hp_bar as shadow_hp_bar
+    from keyboards import arena_move_keyboard, main_menu, shadow_move_keyboard, shop_list_keyboard
+
+    number = max(1, int(5000 * scale))
+    shop_items = [{**item, "id": i} for i, item in enumerate(_INITIAL_ITEMS, 1)]
+    return {
+        "render.arena_hp_bar": _bench(lambda: arena_hp_bar(37, 50), number),
+        "render.shadow_hp_bar": _bench(lambda: shadow_hp_bar(12, 40), number),
+        "render.arena_move_keyboard": _bench(lambda: arena_move_keyboard(1, 3, 2), max(1, number // 10)),
+        "render.shadow_move_keyboard": _bench(lambda: shadow_move_keyboard(2, None, 1), max(1, number // 10)),
+        "render.shop_list_keyboard": _bench(lambda: shop_list_keyboard(shop_items, "rogue"), max(1, number // 50)),
+        "render.main_menu": _bench(main_menu, max(1, number // 10)),
+    }
+
+
+# ----- db -----
+async def _db_reads(db, timer: _AsyncTimer, ids: list[int]) -> None:
+    for pid in ids:
+        # В синтетике telegram_id = id игрока
+        await timer("get_player_by_telegram_id", db.get_player_by_telegram_id(pid))
+        await timer("get_player_context", db.get_player_context(pid))
+        await timer("get_combat_stats", db.get_combat_stats(pid))
+        await timer("get_combat_stats_many", db.get_combat_stats_many([pid, ids[0]], for_arena=True))
+        await timer("get_derived_stats", db.get_derived_stats(pid))
+        await timer("get_player_inventory", db.get_player_inventory(pid))
+        await timer("get_player_potions", db.get_player_potions(pid))
+        await timer("has_trauma", db.has_trauma(pid))
+        await timer("has_active_fight", db.has_active_fight(pid))
+        await timer("get_active_battle_for_player", db.get_active_battle_for_player(pid))
+        await timer("get_active_shadow_fight", db.get_active_shadow_fight(pid))
+        await timer("get_user_rank", db.get_user_rank(pid))
+    for _ in ids[:50]:
+        await timer("get_leaderboard", db.get_leaderboard(100))
+        await timer("get_board_rows", db.get_board_rows("level", 20))
+        await timer("get_top_rich", db.get_top_rich(3))
+        await timer("get_shop_items", db.get_shop_items())
+        await timer("get_players_count", db.get_players_count())
+
+
+async def _db_writes(db, timer: _AsyncTimer, ids: list[int]) -> None:
+    items = [i for i in db.catalog.all() if i["slot"] != "potion"]
+    for pid in ids:
+        await timer("add_credits", db.add_credits(pid, 100))
+        await timer("add_experience", db.add_experience(pid, 1))
+        ok, _ = await timer("buy_item", db.buy_item(pid, random.choice(items)["id"]))
+        if ok:
+            inv = await db.get_player_inventory(pid)
+            sellable = [r for r in inv if not r.get("is_equipped")]
+            if sellable:
+                await timer("sell_item", db.sell_item(pid, sellable[-1]["id"]))
+
+
+async def _db_shadow(db, timer: _AsyncTimer, ids: list[int]) -> None:
+    for pid in ids:
+        fight = await timer("start_shadow_fight", db.start_shadow_fight(pid))
+        if not fight:
+            continue
+        await timer("use_potion_shadow", db.use_potion_shadow(fight["id"], pid))
+        for _ in range(30):
+            updated, *_ = await timer(
+                "process_shadow_turn", db.process_shadow_turn(fight["id"], random.randint(1, 3), random.randint(1, 3)),
+            )
+            if not updated or updated["is_finished"]:
+                break
+        else:
+            await timer("finish_shadow_fight", db.finish_shadow_fight(fight["id"]))
+
+
+async def _db_arena(db, timer: _AsyncTimer, ids: list[int]) -> None:
+    from services.game_math import BattleMath
+    from services.rng import combat_rng, fight_seed
+
+    for p1, p2 in zip(ids[::2], ids[1::2]):
+        if p1 == p2:
+            continue
+        await db.add_credits(p1, 100)
+        await db.add_credits(p2, 100)
+        s1, _ = await timer("arena_enqueue", db.arena_enqueue(p1))
+        s2, _ = await timer("arena_enqueue", db.arena_enqueue(p2))
+        if s1 != "queued" or s2 != "queued":
+            await db.arena_leave_queue(p1)
+            await db.arena_leave_queue(p2)
+            continue
+        await timer("get_arena_queue", db.get_arena_queue())
+        battle_id, _ = await timer("arena_match_queued", db.arena_match_queued(p1, p2))
+        if battle_id is None:
+            continue
+        for _ in range(30):
+            await timer("make_move", db.make_move(battle_id, p1, random.randint(1, 3), random.randint(1, 3)))
+            await timer("make_move", db.make_move(battle_id, p2, random.randint(1, 3), random.randint(1, 3)))
+            b = await timer("get_battle", db.get_battle(battle_id))
+            f1, f2 = await timer("get_battle_fighters", db.get_battle_fighters(b))
+            hp1, hp2, logs = BattleMath.resolve_round(
+                {**f1, "hp": b["player1_hp"]}, {**f2, "hp": b["player2_hp"]},
+                b["p1_attack_zone"], b["p1_block_zone"], b["p2_attack_zone"], b["p2_block_zone"],
+                rng=combat_rng(fight_seed(b), b["round_number"]),
+            )
+            result = await timer("commit_arena_round", db.commit_arena_round(battle_id, b["round_number"], hp1, hp2, logs=logs))
+            if result and result.get("is_finished"):
+                break
+        else:
+            await timer("surrender_battle", db.surrender_battle(battle_id, p2))
+        await db.clear_trauma(p1)
+        await db.clear_trauma(p2)
+
+
+async def bench_db(scale: float, players: int, battles: int, schema: str, keep: bool) -> dict[str, dict]:
+    import asyncpg
+    from dotenv import load_dotenv
+
+    from benchmarks.index_plan import _seed
+    from database.db import Database, _init_connection
+
+    load_dotenv()
+    dsn = os.getenv("DB_URL", "").strip().replace("postgresql+asyncpg://", "postgresql://", 1)
+    if not dsn:
+        raise SystemExit("Set DB_URL in .env")
+    admin = await asyncpg.connect(dsn)
+    await admin.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    db = Database()
+    db.stats_cache.maxsize = 0  # мерим БД, а не кэши
+    db.player_ctx_cache.ttl = 0
+    db._pool = await asyncpg.create_pool(
+        dsn=dsn, min_size=1, max_size=4, command_timeout=600,
+        server_settings={"search_path": schema}, init=_init_connection,
+    )
+    timer = _AsyncTimer()
+    try:
+        await db.init()
+        async with db.pool.acquire() as conn:
+            await _seed(conn, 0, players, 0, battles)
+        await db.load_rank_index()
+        n = max(2, int(200 * scale))
+        rnd = random.Random(0)
+        ids = [rnd.randint(1, players) for _ in range(n)]
+        await _db_reads(db, timer, ids)
+        await _db_writes(db, timer, ids)
+        await _db_shadow(db, timer, ids[: max(1, n // 4)])
+        await _db_arena(db, timer, rnd.sample(range(1, players + 1), min(players, max(2, n // 2))))
+    finally:
+        await db.close()
+        if not keep:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await admin.close()
+    return timer.results("db")
+
+
+# ----- run / compare -----
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(groups: list[str], scale: float, players: int, battles: int, schema: str, keep: bool) -> dict:
+    results: dict[str, dict] = {}
+    if "math" in groups:
+        results.update(bench_math(scale))
+    if "render" in groups:
+        results.update(bench_render(scale))
+    if "db" in groups:
+        results.update(asyncio.run(bench_db(scale, players, battles, schema, keep)))
+    for name, r in results.items():
+        print(f"  {name:<42} p50 {r['p50_us']:>10.2f} us   p99 {r['p99_us']:>10.2f} us   {r['ops_s']:>12.1f} /s")
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "groups": groups,
+            "scale": scale,
+            "players": players if "db" in groups else None,
+            "battles": battles if "db" in groups else None,
+        },
+        "results": results,
+    }
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[str]:
+    """Печатает сравнение p50; возвращает имена замеров, ставших медленнее больше чем на threshold."""
+    bm, nm = base.get("meta", {}), new.get("meta", {})
+    print(f"  база {bm.get('commit')} ({bm.get('host')}) -> {nm.get('commit')} ({nm.get('host')})")
+    if bm.get("host") != nm.get("host"):
+        print("  ⚠️ прогоны с разных машин — сравнение ориентировочное")
+    regressions = []
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        b, n = base["results"].get(name), new["results"].get(name)
+        if b is None or n is None:
+            print(f"  {name:<42} {'только в новом' if b is None else 'только в базе'}")
+            continue
+        change = n["p50_us"] / b["p50_us"] - 1 if b["p50_us"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  ❗ регрессия"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  ✅ быстрее"
+        print(f"  {name:<42} {b['p50_us']:>10.2f} -> {n['p50_us']:>10.2f} us  {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(prog="benchmarks.run compare", description="Сравнить два JSON прогона")
+        parser.add_argument("base")
+        parser.add_argument("new")
+        parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление p50 (доля)")
+        args = parser.parse_args(sys.argv[2:])
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print(f"\n  Регрессии ({len(regressions)}): {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", default="math,render,db", help=f"группы через запятую: {','.join(GROUPS)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель числа повторов")
+    parser.add_argument("--players", type=int, default=100_000, help="игроков в синтетике (db)")
+    parser.add_argument("--battles", type=int, default=1_000_000, help="боёв в синтетике (db)")
+    parser.add_argument("--schema", default="bench_run")
+    parser.add_argument("--keep", action="store_true", help="не удалять схему после замера")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="сразу сравнить с этим JSON (код выхода 1 при регрессии)")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    groups = [g for g in args.groups.split(",") if g]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"неизвестные группы: {', '.join(sorted(unknown))}")
+    report = run(groups, args.scale, args.players, args.battles, args.schema, args.keep)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        print()
+        if compare(base, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
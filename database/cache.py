@@ -0,0 +1,112 @@
+"""
+LRU-кэш производных боевых статов (экипировка, класс, базовые статы, уровень) по player_id.
+Кредиты, опыт, HP и травма в кэш не попадают — они меняются каждый бой.
+TTL-кэш контекста игрока для middlewares/player_context.py.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class CombatStatsCache:
+    """Ограниченный LRU с счётчиками попаданий/промахов. Инвалидация — вызовом invalidate(player_id)."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, player_id: int) -> Optional[dict]:
+        item = self._data.get(player_id)
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(player_id)
+        self.hits += 1
+        return item
+
+    def put(self, player_id: int, derived: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[player_id] = derived
+        self._data.move_to_end(player_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, player_id: int) -> None:
+        if self._data.pop(player_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Счётчики для админки/логов: size, hits, misses, hit_rate, evictions, invalidations."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class PlayerContextCache:
+    """
+    Кэш контекста игрока (строка players, активный бой/тень, травма) по telegram_id с коротким TTL.
+    Database сбрасывает запись при смене боя, травмы или класса (invalidate_player); TTL ограничивает
+    устаревание из-за записей других процессов.
+    """
+
+    def __init__(self, ttl: float = 2.0, maxsize: int = 50000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._tg_by_player: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int) -> Optional[dict]:
+        item = self._data.get(telegram_id)
+        if item is None or item[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def put(self, telegram_id: int, ctx: dict) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[telegram_id] = (time.monotonic() + self.ttl, ctx)
+        self._data.move_to_end(telegram_id)
+        self._tg_by_player[ctx["player"]["id"]] = telegram_id
+        while len(self._data) > self.maxsize:
+            _, (_, old) = self._data.popitem(last=False)
+            self._tg_by_player.pop(old["player"]["id"], None)
+
+    def invalidate_player(self, player_id: int) -> None:
+        telegram_id = self._tg_by_player.pop(player_id, None)
+        if telegram_id is not None:
+            self._data.pop(telegram_id, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
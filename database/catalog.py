@@ -0,0 +1,82 @@
+"""
+Каталог предметов в памяти процесса: магазин и поиск предмета по id/имени без запросов в БД.
+Таблица items меняется только миграциями (при старте) и create_custom_item, поэтому каталог
+перечитывается целиком в этих местах (Database.load_catalog); version растёт при каждой перезагрузке.
+Витрины (категория, уровень, класс) собираются один раз при загрузке. Словари предметов общие — только чтение.
+"""
+from typing import Iterable, Optional
+
+# Категории магазина -> слоты (как Database.get_shop_items_by_category)
+CATEGORY_SLOTS = {
+    "weapons": ("weapon",),
+    "armor": ("head", "body", "legs"),
+    "elixirs": ("potion",),
+}
+CLASS_TYPES = ("rogue", "tank", "warrior")
+
+
+class ItemCatalog:
+    def __init__(self):
+        self.version = 0
+        self._items: list[dict] = []
+        self._by_id: dict[int, dict] = {}
+        self._by_name: dict[str, dict] = {}
+        # (category, min_level | None, class_type | None) -> предметы по (min_level, price, id)
+        self._views: dict[tuple[str, Optional[int], Optional[str]], list[dict]] = {}
+        self._default_potion_id: Optional[int] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.version > 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def load(self, rows: Iterable[dict]) -> None:
+        items = sorted(rows, key=lambda i: ((i.get("min_level") or 1), i.get("price") or 0, i["id"]))
+        views: dict[tuple[str, Optional[int], Optional[str]], list[dict]] = {}
+        for category, slots in CATEGORY_SLOTS.items():
+            in_category = [i for i in items if i.get("slot") in slots]
+            views[(category, None, None)] = in_category
+            for cls in CLASS_TYPES:
+                views[(category, None, cls)] = [i for i in in_category if _fits_class(i, cls)]
+            for level in {i.get("min_level") or 1 for i in in_category}:
+                on_level = [i for i in in_category if (i.get("min_level") or 1) == level]
+                views[(category, level, None)] = on_level
+                for cls in CLASS_TYPES:
+                    views[(category, level, cls)] = [i for i in on_level if _fits_class(i, cls)]
+        potions = sorted(views[("elixirs", None, None)], key=lambda i: (i.get("heal_percent") or 0, i["id"]))
+        self._items = items
+        self._by_id = {i["id"]: i for i in items}
+        # При одинаковых именах остаётся первый по id (как SELECT ... WHERE name = $1 без ORDER BY на свежей таблице)
+        self._by_name = {}
+        for i in sorted(items, key=lambda i: i["id"]):
+            self._by_name.setdefault(i["name"], i)
+        self._views = views
+        self._default_potion_id = potions[0]["id"] if potions else None
+        self.version += 1
+
+    def all(self) -> list[dict]:
+        """Все предметы в порядке магазина (min_level, price)."""
+        return self._items
+
+    def get(self, item_id: int) -> Optional[dict]:
+        return self._by_id.get(item_id)
+
+    def by_name(self, name: str) -> Optional[dict]:
+        return self._by_name.get(name)
+
+    def view(self, category: str, level: Optional[int] = None, class_type: Optional[str] = None) -> list[dict]:
+        """Витрина категории (weapons/armor/elixirs); level — ровно этот min_level, class_type — свой класс + 'all'."""
+        return self._views.get((category, level, class_type), [])
+
+    def potion_id(self, name: Optional[str] = None) -> Optional[int]:
+        """Зелье по имени, по умолчанию — с наименьшим heal_percent (Бинты)."""
+        if name is None:
+            return self._default_potion_id
+        item = self._by_name.get(name)
+        return item["id"] if item and item.get("slot") == "potion" else None
+
+
+def _fits_class(item: dict, class_type: str) -> bool:
+    return (item.get("class_type") or "all").lower() in ("all", class_type)
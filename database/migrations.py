@@ -0,0 +1,64 @@
+"""
+Версионные миграции схемы: таблица schema_migrations и нумерованные шаги.
+Каждый шаг применяется в своей транзакции вместе с записью версии; на старте выполняются
+только недостающие шаги. Параллельный старт нескольких процессов сериализуется advisory-локом.
+Сами шаги (схема, сид каталога) описаны в database/db.py (_MIGRATIONS).
+"""
+import logging
+from typing import Awaitable, Callable, NamedTuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock для миграций (любой постоянный bigint)
+MIGRATIONS_LOCK_KEY = 7_466_630_001
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[asyncpg.Connection], Awaitable[None]]
+
+
+async def current_version(conn: asyncpg.Connection) -> int:
+    """Последняя применённая версия; 0 если таблицы schema_migrations ещё нет."""
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations") or 0
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def run_migrations(conn: asyncpg.Connection, migrations: list[Migration]) -> list[int]:
+    """
+    Применить недостающие миграции по возрастанию version. Возвращает список применённых версий.
+    Быстрый путь (всё применено) — один SELECT.
+    """
+    latest = max((m.version for m in migrations), default=0)
+    if await current_version(conn) >= latest:
+        return []
+    applied: list[int] = []
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            )
+        """)
+        done = {r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations")}
+        for m in sorted(migrations, key=lambda m: m.version):
+            if m.version in done:
+                continue
+            async with conn.transaction():
+                await m.apply(conn)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                    m.version, m.name,
+                )
+            applied.append(m.version)
+            logger.info("Migration %s (%s) applied", m.version, m.name)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
+    return applied
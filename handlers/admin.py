@@ -2,12 +2,18 @@
 Админ-панель. Владелец 306039666; права админа можно выдавать по Telegram ID.
 """
 import os
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.filters import Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from database.db import db
+from services.scheduler import Scheduler
+from services.state_store import state_store
+from services.sender import sender
+from services.win_solver import win_solver
 
 router = Router(name="admin")
 
@@ -31,18 +37,46 @@ def _admin_keyboard():
 
 
 @router.message(Command("admin"))
-async def admin_panel(message: Message) -> None:
+async def admin_panel(message: Message, scheduler: Optional[Scheduler] = None) -> None:
     if not message.from_user or not await is_admin(message.from_user.id):
         await message.answer("Команда не найдена.")
         return
     total_commission = await db.get_system_commission()
     players_count = await db.get_players_count()
     battles_count = await db.get_battles_count()
+    cache = db.stats_cache.stats()
+    ctx_cache = db.player_ctx_cache.stats()
+    fights = db.fights.stats()
+    sel = state_store.stats()
+    events = db.events.stats()
+    out = sender.stats()
+    odds = win_solver.stats()
+    odds_line = f"📊 Шансы победы: {odds['size']} таблиц, {odds['hit_rate']:.0%} попаданий\n" if odds["available"] else ""
+    jobs = ""
+    if scheduler is not None:
+        role = "лидер" if scheduler.is_leader else "резерв"
+        jobs = f"⏱ Фоновые задачи ({role}):\n" + "".join(
+            f"  {j['name']}: {j['runs']} запусков, {j['failures']} ошибок, "
+            f"среднее {j['avg_ms']} мс, макс {j['max_ms']} мс\n"
+            for j in scheduler.stats()
+        )
     await message.answer(
         "👑 <b>Админ-панель</b>\n\n"
         f"💰 Банк системы: <b>{total_commission}</b> кр.\n"
         f"👥 Игроков: {players_count}\n"
-        f"⚔️ Боев: {battles_count}\n\n"
+        f"⚔️ Боев: {battles_count}\n"
+        f"🗄 Кэш статов: {cache['hits']} попаданий / {cache['misses']} промахов "
+        f"({cache['hit_rate']:.0%}), в кэше {cache['size']}\n"
+        f"🥊 Сейчас в бою: {fights['arena_players']} на арене, {fights['shadow_players']} с тенью\n"
+        f"🧾 Кэш контекста игроков: {ctx_cache['hit_rate']:.0%} попаданий, в кэше {ctx_cache['size']}\n"
+        f"🎯 Выбор зон ({sel['backend']}): {sel.get('size', '—')} записей, "
+        f"вытеснено {sel.get('evictions', 0)}, просрочено {sel['expirations']}\n"
+        f"📨 События боёв: {events['published']} опубликовано, {events['delivered']} доставлено, "
+        f"{events['failures']} ошибок\n"
+        f"📤 Исходящие: {out['sent']} отправлено, {out['edited']} правок, {out['coalesced']} схлопнуто, "
+        f"429: {out['retried']}, ошибок {out['failed']}, в очереди {out['queued']}\n"
+        f"{odds_line}"
+        f"{jobs}\n"
         "Снять кассу (обнулить банк и зафиксировать прибыль):\n\n"
         "<b>🛠 Управление:</b>\n"
         "/give_money [telegram_id] [сумма]\n"
@@ -1,7 +1,9 @@
 """
 PvP Arena: шахматка (Атака/Защита), лог с чёрным юмором, травмы (1 HP/мин), финальные фразы.
 """
-import random
+import asyncio
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -9,13 +11,22 @@ from aiogram.filters import Command
 from keyboards import arena_keyboard, arena_move_keyboard, ZONE_NAMES
 from services.game_math import BattleMath, CombatStats
 from services.battle_phrases import get_victory_phrase, get_defeat_phrase
-from database.db import Database
+from services.matchmaking import Matchmaker
+from services.state_store import state_store
+from services.routing import battle_locks
+from services.rng import combat_rng, fight_seed
+from services.events import EventBus, MATCH_FOUND, ROUND_RESOLVED, BATTLE_FINISHED
+from services.sender import sender, BATTLE, MENU
+from services.win_solver import win_solver
 from database.db import db
+from middlewares.player_context import PlayerContext
 
 router = Router(name="arena")
 
-# Состояние выбора зон: (player_id, battle_id) -> {"atk": int|None, "def": int|None}
-_arena_selection: dict[tuple[int, int], dict] = {}
+
+def _sel_key(player_id: int, battle_id: int) -> str:
+    """Ключ выбора зон в state_store: {"atk": int|None, "def": int|None}."""
+    return f"arena:{player_id}:{battle_id}"
 
 
 def draw_hp_bar(current: int, max_hp: int = 50, length: int = 8) -> str:
@@ -28,17 +39,40 @@ def draw_hp_bar(current: int, max_hp: int = 50, length: int = 8) -> str:
     return f"{bar}{'⬜' * empty} ({current})"
 
 
-async def get_telegram_id_by_player_id(db_inst: Database, player_id: int) -> int | None:
-    async with db_inst.pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT telegram_id FROM players WHERE id = $1", player_id)
-        return row["telegram_id"] if row else None
+BANDAGE_LIMIT = 2
+
 
+async def _odds_line(s1: dict, s2: dict, hp1: int, hp2: int, is_p1: bool) -> str:
+    """«📊 Шанс победы» для игрока по точному расчёту (services/win_solver.py); пусто без numpy."""
+    odds = await win_solver.win_chance(s1, s2, hp1, hp2)
+    if odds is None:
+        return ""
+    p1_win, rounds = odds
+    chance = p1_win if is_p1 else 1 - p1_win
+    return f"📊 Шанс победы: {chance:.0%} (≈ {rounds:.0f} раундов)\n"
 
-BANDAGE_LIMIT = 2
+
+async def _active_battle(ctx: PlayerContext) -> Optional[dict]:
+    """Активный бой из контекста запроса (id уже известен — выборка по PK)."""
+    if ctx.battle_id is None:
+        return None
+    battle = await db.get_battle(ctx.battle_id)
+    return battle if battle and not battle["is_finished"] else None
 
 
-def _arena_kb(player_id: int, battle_id: int, battle: dict | None = None, bandage_remaining: int | None = None):
-    sel = _arena_selection.get((player_id, battle_id), {})
+async def _battle_max_hp(battle: dict, is_p1: bool) -> tuple[int, int]:
+    """(мой MaxHP, MaxHP соперника) из снапшотов боя."""
+    s1, s2 = await db.get_battle_fighters(battle)
+    mine, opp = (s1, s2) if is_p1 else (s2, s1)
+    return mine.get("max_hp", 50), opp.get("max_hp", 50)
+
+
+async def _arena_kb(
+    player_id: int, battle_id: int, battle: dict | None = None, bandage_remaining: int | None = None,
+    sel: dict | None = None,
+):
+    if sel is None:
+        sel = await state_store.get(_sel_key(player_id, battle_id)) or {}
     if bandage_remaining is None and battle:
         is_p1 = battle["player1_id"] == player_id
         used = battle.get("p1_bandage_uses" if is_p1 else "p2_bandage_uses", 0) or 0
@@ -48,39 +82,41 @@ def _arena_kb(player_id: int, battle_id: int, battle: dict | None = None, bandag
 
 @router.message(F.text == "🏟 Арена (PvP)")
 @router.message(Command("arena"))
-async def arena_menu(message: Message) -> None:
-    await db.close_stale_battles(15)
-    player = await db.get_player_by_telegram_id(message.from_user.id if message.from_user else 0)
+async def arena_menu(message: Message, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await message.answer("Сначала /start")
         return
-    if await db.has_trauma(player["id"]):
+    if player_ctx.has_trauma:
         await message.answer(
             "🛑 <b>Вы ранены!</b>\n\nПодождите или выпейте эликсир (Инвентарь → Зелья → Выпить).",
             parse_mode="HTML",
         )
         return
 
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if battle:
         is_p1 = battle["player1_id"] == player["id"]
         my_hp = battle["player1_hp"] if is_p1 else battle["player2_hp"]
         opp_hp = battle["player2_hp"] if is_p1 else battle["player1_hp"]
         opp_name = (battle["p2_name"] if is_p1 else battle["p1_name"]) or "Соперник"
-        s = await db.get_combat_stats(player["id"], for_arena=True)
-        max_hp = s.get("max_hp", 50)
+        s1, s2 = await db.get_battle_fighters(battle)
+        mine, opp = (s1, s2) if is_p1 else (s2, s1)
+        max_hp, opp_max_hp = mine.get("max_hp", 50), opp.get("max_hp", 50)
+        odds = await _odds_line(s1, s2, battle["player1_hp"], battle["player2_hp"], is_p1)
 
         txt = (
             f"⚔ <b>Ваш бой продолжается!</b>\n\n"
             f"👤 Вы: {draw_hp_bar(my_hp, max_hp)}\n"
-            f"👤 {opp_name}: {draw_hp_bar(opp_hp)}\n\n"
+            f"👤 {opp_name}: {draw_hp_bar(opp_hp, opp_max_hp)}\n"
+            f"{odds}\n"
             "👇 Выберите зону атаки и защиты, затем подтвердите удар:"
         )
         try:
             await message.delete()
         except Exception:
             pass
-        new_msg = await message.answer(txt, reply_markup=_arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML")
+        new_msg = await message.answer(txt, reply_markup=await _arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML")
         await db.set_battle_message_id(battle["id"], player["id"], new_msg.message_id)
         return
 
@@ -91,17 +127,137 @@ async def arena_menu(message: Message) -> None:
     )
 
 
+async def send_battle_start(battle_id: int) -> None:
+    """«БОЙ НАЧАЛСЯ» с клавиатурой хода бойцам, которых обслуживает этот процесс (событие match_found)."""
+    battle = await db.get_battle(battle_id)
+    if not battle:
+        return
+    p1_tg, p2_tg = battle["p1_tg"], battle["p2_tg"]
+    stake = battle.get("stake") or 10
+    s1, s2 = await db.get_battle_fighters(battle)
+    max1, max2 = s1.get("max_hp", 50), s2.get("max_hp", 50)
+    hp1, hp2 = battle["player1_hp"], battle["player2_hp"]
+
+    txt1 = (
+        f"⚔ <b>БОЙ НАЧАЛСЯ!</b> (ставка {stake} кр.)\n\n"
+        f"👤 Вы: {draw_hp_bar(hp1, max1)}\n"
+        f"🆚 {battle['p2_name'] or 'Боец'}: {draw_hp_bar(hp2, max2)}\n"
+        f"{await _odds_line(s1, s2, hp1, hp2, True)}\n"
+        "👇 Выберите зону атаки и защиты:"
+    )
+    txt2 = (
+        f"⚔️ <b>БОЙ</b>\nБой начался! (ставка {stake} кр.)\n\n"
+        f"👤 Вы: {draw_hp_bar(hp2, max2)}\n"
+        f"🆚 {battle['p1_name'] or 'Боец'}: {draw_hp_bar(hp1, max1)}\n"
+        f"{await _odds_line(s1, s2, hp1, hp2, False)}\n"
+        "👇 Выберите зону атаки и защиты:"
+    )
+    kb = arena_move_keyboard(None, None, BANDAGE_LIMIT)
+
+    async def deliver(tg_id: int, player_id: int, txt: str) -> None:
+        m = await sender.send(tg_id, txt, reply_markup=kb, parse_mode="HTML", priority=BATTLE)
+        await db.set_battle_message_id(battle_id, player_id, m.message_id)
+
+    # Обоим бойцам параллельно (очередь сама соблюдает лимиты Telegram)
+    await asyncio.gather(*(
+        deliver(tg_id, player_id, txt)
+        for tg_id, player_id, txt in (
+            (p1_tg, battle["player1_id"], txt1),
+            (p2_tg, battle["player2_id"], txt2),
+        )
+        if tg_id and db.events.owns(tg_id)
+    ))
+
+
+async def _edit_quietly(message: Message, text: str, **kwargs) -> None:
+    """Правка своего сообщения через очередь; если отредактировать нельзя — молча пропускаем."""
+    try:
+        await sender.edit_message(message, text, fallback_send=False, **kwargs)
+    except Exception:
+        pass
+
+
+def _bandage_left(b: dict, is_p1: bool) -> int:
+    col = "p1_bandage_uses" if is_p1 else "p2_bandage_uses"
+    used = b.get(col, 0) or 0
+    return max(0, BANDAGE_LIMIT - used)
+
+
+async def send_round_result(event: dict) -> None:
+    """
+    round_resolved / battle_finished: итог раунда (или сдачи) бойцам этого процесса.
+    HP, лог и победитель — из события; имена, MaxHP, id сообщений и бинты — из строки боя.
+    """
+    b = await db.get_battle(event["battle_id"])
+    if not b:
+        return
+    finished = event.get("winner_id") is not None
+    surrender = event.get("reason") == "surrender"
+    s1, s2 = await db.get_battle_fighters(b)
+    name1 = (b.get("p1_name") or "Боец")[:20]
+    name2 = (b.get("p2_name") or "Боец")[:20]
+
+    async def deliver(is_p1: bool, tg_id: int) -> None:
+        my_id = b["player1_id"] if is_p1 else b["player2_id"]
+        msg_id = b.get("p1_msg_id" if is_p1 else "p2_msg_id")
+        kb = None
+        if surrender:
+            text = "🏳 <b>Бой завершён сдачей!</b>\n\nОдин из игроков покинул поле боя.\n👉 /arena"
+        else:
+            hp1, hp2 = event["hp1"], event["hp2"]
+            bar1 = draw_hp_bar(hp1, s1.get("max_hp", 50))
+            bar2 = draw_hp_bar(hp2, s2.get("max_hp", 50))
+            text = f"🥊 <b>Раунд {event['round']}</b>\n" + "\n".join(event.get("logs") or []) + "\n\n"
+            text += f"👤 Вы: {bar1}\n🆚 {name2}: {bar2}" if is_p1 else f"👤 Вы: {bar2}\n🆚 {name1}: {bar1}"
+            if finished:
+                if event["winner_id"] == my_id:
+                    text += f"\n\n🏆 <b>ПОБЕДА!</b>\n{get_victory_phrase()}\n💰 Получено: {event['winner_gain']} кр.\n👉 /arena"
+                else:
+                    text += f"\n\n💀 <b>ПОРАЖЕНИЕ.</b>\n{get_defeat_phrase()}\n👉 /arena"
+            else:
+                text += "\n" + await _odds_line(s1, s2, hp1, hp2, is_p1) + "\n👇 Ваш ход:"
+                kb = arena_move_keyboard(None, None, _bandage_left(b, is_p1))
+        if msg_id:
+            new_id = await sender.edit(tg_id, msg_id, text, reply_markup=kb, parse_mode="HTML")
+        else:
+            new_id = (await sender.send(tg_id, text, reply_markup=kb, parse_mode="HTML", priority=BATTLE)).message_id
+        if new_id:
+            await db.set_battle_message_id(b["id"], my_id, new_id)
+
+    await asyncio.gather(*(
+        deliver(is_p1, tg_id)
+        for is_p1, tg_id in ((True, b["p1_tg"]), (False, b["p2_tg"]))
+        if tg_id and db.events.owns(tg_id)
+    ))
+
+
+def subscribe_events(bus: EventBus) -> None:
+    """Рассылка по событиям боёв (в любом процессе, которому принадлежит получатель) через services/sender.py."""
+    bus.subscribe(MATCH_FOUND, lambda e: send_battle_start(e["battle_id"]))
+    bus.subscribe(ROUND_RESOLVED, send_round_result)
+    bus.subscribe(BATTLE_FINISHED, send_round_result)
+
+
 @router.callback_query(F.data == "arena_find")
-async def arena_find(callback: CallbackQuery) -> None:
-    await db.close_stale_battles(15)
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_find(callback: CallbackQuery, player_ctx: Optional[PlayerContext], matchmaker: Optional[Matchmaker] = None) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    if await db.has_trauma(player["id"]):
+    if player_ctx.has_trauma:
         await callback.answer("🛑 Вы ранены! Подождите или выпейте эликсир.", show_alert=True)
         return
 
-    status, battle_id, msg = await db.arena_join_queue(player["id"], stake=10)
+    if matchmaker is not None:
+        # Подбор пары в памяти: здесь только ставка + очередь, «БОЙ НАЧАЛСЯ» пришлёт matchmaker
+        status, level = await db.arena_enqueue(player["id"], stake=10)
+        if status == "no_credits":
+            await callback.answer("Недостаточно кредитов для ставки (нужно 10 кр.).", show_alert=True)
+            return
+        if status == "queued":
+            matchmaker.submit(player["id"], level, 10)
+        status, battle_id = "waiting", None
+    else:
+        status, battle_id, msg = await db.arena_join_queue(player["id"], stake=10)
 
     if status == "no_credits":
         await callback.answer(msg, show_alert=True)
@@ -111,44 +267,19 @@ async def arena_find(callback: CallbackQuery) -> None:
         return
 
     if status == "waiting":
-        await callback.message.edit_text(
+        await callback.answer()
+        await sender.edit_message(
+            callback.message,
             "⏳ <b>Поиск соперника...</b>\nСтавка: 10 кр. Ожидайте.",
             reply_markup=arena_keyboard(),
             parse_mode="HTML",
+            priority=MENU,
+            fallback_send=False,
         )
-        await callback.answer()
         return
 
     if status == "matched" and battle_id:
-        battle = await db.get_battle(battle_id)
-        p1_tg = await get_telegram_id_by_player_id(db, battle["player1_id"])
-        p2_tg = await get_telegram_id_by_player_id(db, battle["player2_id"])
-        stake = battle.get("stake") or 10
-        s1 = await db.get_combat_stats(battle["player1_id"], for_arena=True)
-        s2 = await db.get_combat_stats(battle["player2_id"], for_arena=True)
-        max1, max2 = s1.get("max_hp", 50), s2.get("max_hp", 50)
-
-        txt1 = (
-            f"⚔ <b>БОЙ НАЧАЛСЯ!</b> (ставка {stake} кр.)\n\n"
-            f"👤 Вы: {draw_hp_bar(battle['player1_hp'], max1)}\n"
-            f"🆚 {battle['p2_name'] or 'Боец'}: {draw_hp_bar(battle['player2_hp'], max2)}\n\n"
-            "👇 Выберите зону атаки и защиты:"
-        )
-        txt2 = (
-            f"⚔️ <b>БОЙ</b>\nБой начался! (ставка {stake} кр.)\n\n"
-            f"👤 Вы: {draw_hp_bar(battle['player2_hp'], max2)}\n"
-            f"🆚 {battle['p1_name'] or 'Боец'}: {draw_hp_bar(battle['player1_hp'], max1)}\n\n"
-            "👇 Выберите зону атаки и защиты:"
-        )
-        kb = arena_move_keyboard(None, None, BANDAGE_LIMIT)
-
-        if p1_tg:
-            m = await callback.bot.send_message(p1_tg, txt1, reply_markup=kb, parse_mode="HTML")
-            await db.set_battle_message_id(battle_id, battle["player1_id"], m.message_id)
-        if p2_tg:
-            m = await callback.bot.send_message(p2_tg, txt2, reply_markup=kb, parse_mode="HTML")
-            await db.set_battle_message_id(battle_id, battle["player2_id"], m.message_id)
-
+        # «БОЙ НАЧАЛСЯ» рассылает подписчик match_found — в фоне, отдельным сообщением
         try:
             await callback.message.delete()
         except Exception:
@@ -157,75 +288,78 @@ async def arena_find(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data == "arena_leave")
-async def arena_cancel_search(callback: CallbackQuery) -> None:
+async def arena_cancel_search(callback: CallbackQuery, player_ctx: Optional[PlayerContext], matchmaker: Optional[Matchmaker] = None) -> None:
     """Отмена поиска: только если игрок в очереди, не в бою. Возврат ставки 10 кр."""
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.get_active_battle_for_player(player["id"]):
+    if await _active_battle(player_ctx):
         await callback.answer("Бой уже начался. Отмена невозможна.", show_alert=True)
         return
-    ok, msg = await db.arena_leave_queue(player["id"], stake=10)
+    ok, msg = await db.arena_leave_queue(player["id"])
     if not ok:
         await callback.answer(msg, show_alert=True)
         return
-    await callback.message.edit_text(
+    if matchmaker is not None:
+        matchmaker.remove(player["id"])
+    await callback.answer(msg)
+    await sender.edit_message(
+        callback.message,
         f"✅ {msg}\n\n"
         "🏟 <b>Арена PvP</b>\n\nНажмите «Найти соперника».",
         reply_markup=arena_keyboard(),
         parse_mode="HTML",
+        priority=MENU,
+        fallback_send=False,
     )
-    await callback.answer(msg)
 
 
 # Выбор зоны атаки/защиты (шахматка)
 @router.callback_query(F.data.startswith("move_atk_"))
 @router.callback_query(F.data.startswith("move_def_"))
-async def arena_select_zone(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_select_zone(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
         await callback.answer("Бой завершён.")
         return
 
-    key = (player["id"], battle["id"])
-    _arena_selection.setdefault(key, {"atk": None, "def": None})
     parts = callback.data.split("_")
     zone = int(parts[-1])
-    if callback.data.startswith("move_atk_"):
-        _arena_selection[key]["atk"] = zone
-    else:
-        _arena_selection[key]["def"] = zone
+    field = "atk" if callback.data.startswith("move_atk_") else "def"
+    sel = await state_store.merge(_sel_key(player["id"], battle["id"]), {field: zone})
 
     is_p1 = battle["player1_id"] == player["id"]
     my_hp = battle["player1_hp"] if is_p1 else battle["player2_hp"]
     opp_hp = battle["player2_hp"] if is_p1 else battle["player1_hp"]
     opp_name = (battle["p2_name"] if is_p1 else battle["p1_name"]) or "Соперник"
-    s = await db.get_combat_stats(player["id"], for_arena=True)
-    max_hp = s.get("max_hp", 50)
+    max_hp, opp_max_hp = await _battle_max_hp(battle, is_p1)
 
-    sel = _arena_selection[key]
     txt = (
         f"⚔ <b>Бой</b>\n\n"
         f"👤 Вы: {draw_hp_bar(my_hp, max_hp)}\n"
-        f"👤 {opp_name}: {draw_hp_bar(opp_hp)}\n\n"
-        f"Атака: {ZONE_NAMES.get(sel['atk'], '—')} | Защита: {ZONE_NAMES.get(sel['def'], '—')}\n\n"
+        f"👤 {opp_name}: {draw_hp_bar(opp_hp, opp_max_hp)}\n\n"
+        f"Атака: {ZONE_NAMES.get(sel.get('atk'), '—')} | Защита: {ZONE_NAMES.get(sel.get('def'), '—')}\n\n"
         "👇 Выберите зоны и нажмите «ПОДТВЕРДИТЬ УДАР»:"
     )
-    await callback.message.edit_text(txt, reply_markup=_arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML")
+    # Быстрые нажатия по зонам схлопываются в одну правку (последний выбор)
     await callback.answer()
+    await sender.edit_message(
+        callback.message, txt, reply_markup=await _arena_kb(player["id"], battle["id"], battle=battle, sel=sel),
+        parse_mode="HTML", fallback_send=False,
+    )
 
 
 @router.callback_query(F.data == "move_heal")
-async def arena_heal(callback: CallbackQuery) -> None:
+async def arena_heal(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
     """Free Action: зелье не тратит ход, 1 раз за бой. Обновляем HP и оставляем клавиатуру выбора удара."""
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
         await callback.answer("Бой завершён.")
         return
@@ -239,41 +373,37 @@ async def arena_heal(callback: CallbackQuery) -> None:
     my_hp = battle["player1_hp"] if is_p1 else battle["player2_hp"]
     opp_hp = battle["player2_hp"] if is_p1 else battle["player1_hp"]
     opp_name = (battle["p2_name"] if is_p1 else battle["p1_name"]) or "Соперник"
-    s = await db.get_combat_stats(player["id"], for_arena=True)
-    max_hp = s.get("max_hp", 40)
+    max_hp, opp_max_hp = await _battle_max_hp(battle, is_p1)
     txt = (
         f"⚔️ <b>Бой</b>\n\n"
         f"🧪 {msg}\n\n"
         f"👤 Вы: {draw_hp_bar(my_hp, max_hp)}\n"
-        f"👤 {opp_name}: {draw_hp_bar(opp_hp)}\n\n"
+        f"👤 {opp_name}: {draw_hp_bar(opp_hp, opp_max_hp)}\n\n"
         "👇 Выберите зону атаки и защиты (ход не потрачен):"
     )
-    try:
-        await callback.message.edit_text(
-            txt,
-            reply_markup=_arena_kb(player["id"], battle["id"], battle=battle),
-            parse_mode="HTML",
-        )
-    except Exception:
-        pass
+    await _edit_quietly(
+        callback.message, txt, reply_markup=await _arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML",
+    )
 
 
 @router.callback_query(F.data == "move_confirm")
 @router.callback_query(F.data == "move_auto")
-async def arena_confirm_move(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_confirm_move(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
-        await callback.message.edit_text("❌ Бой завершён.", reply_markup=None)
+        await _edit_quietly(callback.message, "❌ Бой завершён.", reply_markup=None)
         return
 
-    key = (player["id"], battle["id"])
-    sel = _arena_selection.get(key, {})
+    key = _sel_key(player["id"], battle["id"])
+    sel = await state_store.get(key) or {}
 
     if callback.data == "move_auto":
-        atk, blk = random.randint(1, 3), random.randint(1, 3)
+        # Свой поток на игрока и раунд: «Автобой» воспроизводим и не сдвигает числа расчёта раунда
+        auto = combat_rng(fight_seed(battle), battle["round_number"], f"auto:{player['id']}")
+        atk, blk = auto.randint(1, 3), auto.randint(1, 3)
     else:
         atk, blk = sel.get("atk"), sel.get("def")
         if atk is None or blk is None:
@@ -285,130 +415,71 @@ async def arena_confirm_move(callback: CallbackQuery) -> None:
         await callback.answer(msg, show_alert=True)
         return
 
-    _arena_selection.pop(key, None)
+    await state_store.delete(key)
     await callback.answer("Ход принят")
 
-    try:
-        await callback.message.edit_text(
-            f"⏳ <b>Ожидание противника...</b>\n\n"
-            f"💥 Атака: {ZONE_NAMES.get(atk)}\n🛡 Защита: {ZONE_NAMES.get(blk)}",
-            reply_markup=None,
-            parse_mode="HTML",
-        )
-    except Exception:
-        pass
-
-    if not await db.check_round_ready(battle["id"]):
-        return
-
-    # Расчёт раунда
-    b = await db.get_battle(battle["id"])
-    s1 = await db.get_combat_stats(b["player1_id"])
-    s2 = await db.get_combat_stats(b["player2_id"])
-    name1 = (b.get("p1_name") or "Боец")[:20]
-    name2 = (b.get("p2_name") or "Боец")[:20]
-
-    c1 = {**s1, "hp": b["player1_hp"]}
-    c2 = {**s2, "hp": b["player2_hp"]}
-    hp1_new, hp2_new, logs = BattleMath.resolve_round(
-        c1, c2,
-        b["p1_attack_zone"], b["p1_block_zone"],
-        b["p2_attack_zone"], b["p2_block_zone"],
-        name1=name1, name2=name2,
+    await _edit_quietly(
+        callback.message,
+        f"⏳ <b>Ожидание противника...</b>\n\n"
+        f"💥 Атака: {ZONE_NAMES.get(atk)}\n🛡 Защита: {ZONE_NAMES.get(blk)}",
+        reply_markup=None,
+        parse_mode="HTML",
     )
 
-    upd = await db.resolve_round_and_advance(b["id"], hp1_new, hp2_new)
-    stake = b.get("stake") or 10
-    if upd["is_finished"] and upd.get("winner_id") and stake > 0:
-        await db.resolve_arena_winner(b["id"], upd["winner_id"], stake)
-    if upd["is_finished"]:
-        await db.set_player_current_hp(b["player1_id"], hp1_new)
-        await db.set_player_current_hp(b["player2_id"], hp2_new)
-        loser_id = b["player2_id"] if upd["winner_id"] == b["player1_id"] else b["player1_id"]
-        await db.set_trauma(loser_id, 5)
-
-    log_str = "\n".join(logs[-4:])
-    max1, max2 = s1.get("max_hp", 50), s2.get("max_hp", 50)
-    bar1 = draw_hp_bar(hp1_new, max1)
-    bar2 = draw_hp_bar(hp2_new, max2)
-
-    txt_base = f"🥊 <b>Раунд {b['round_number']}</b>\n{log_str}\n\n"
-    txt1 = txt_base + f"👤 Вы: {bar1}\n🆚 {name2}: {bar2}"
-    txt2 = txt_base + f"👤 Вы: {bar2}\n🆚 {name1}: {bar1}"
-
-    def _bandage_left(b: dict, is_p1: bool) -> int:
-        col = "p1_bandage_uses" if is_p1 else "p2_bandage_uses"
-        used = b.get(col, 0) or 0
-        return max(0, BANDAGE_LIMIT - used)
-
-    kb_p1 = kb_p2 = None
-    if not upd["is_finished"]:
-        kb_p1 = arena_move_keyboard(None, None, _bandage_left(upd, True))
-        kb_p2 = arena_move_keyboard(None, None, _bandage_left(upd, False))
-
-    bank = stake * 2
-    winner_gain = bank - int(bank * 0.10)
-
-    async def send_upd(tg_id, msg_id, text, is_p1):
-        if not tg_id:
+    # Расчёт раунда: один SELECT боя (с telegram_id обоих), одна транзакция фиксации.
+    # Оба подтверждения приходят в процесс-владелец боя (services/routing.py) и считаются по очереди.
+    async with battle_locks.get(battle["id"]):
+        b = await db.get_battle(battle["id"])
+        if not b or b["p1_attack_zone"] is None or b["p2_attack_zone"] is None:
             return
-        my_id = b["player1_id"] if is_p1 else b["player2_id"]
-        kb = (kb_p1 if is_p1 else kb_p2) if not upd["is_finished"] else None
-        if upd["is_finished"]:
-            if upd["winner_id"] == my_id:
-                text += f"\n\n🏆 <b>ПОБЕДА!</b>\n{get_victory_phrase()}\n💰 Получено: {winner_gain} кр.\n👉 /arena"
-            else:
-                text += f"\n\n💀 <b>ПОРАЖЕНИЕ.</b>\n{get_defeat_phrase()}\n👉 /arena"
-        else:
-            text += "\n\n👇 Ваш ход:"
-        try:
-            await callback.bot.edit_message_text(
-                text, chat_id=tg_id, message_id=msg_id, reply_markup=kb, parse_mode="HTML",
-            )
-        except Exception:
-            m = await callback.bot.send_message(tg_id, text, reply_markup=kb, parse_mode="HTML")
-            await db.set_battle_message_id(b["id"], my_id, m.message_id)
+        s1, s2 = await db.get_battle_fighters(b)
+        name1 = (b.get("p1_name") or "Боец")[:20]
+        name2 = (b.get("p2_name") or "Боец")[:20]
+
+        c1 = {**s1, "hp": b["player1_hp"]}
+        c2 = {**s2, "hp": b["player2_hp"]}
+        hp1_new, hp2_new, logs = BattleMath.resolve_round(
+            c1, c2,
+            b["p1_attack_zone"], b["p1_block_zone"],
+            b["p2_attack_zone"], b["p2_block_zone"],
+            name1=name1, name2=name2, rng=combat_rng(fight_seed(b), b["round_number"]),
+        )
 
-    p1_tg = await get_telegram_id_by_player_id(db, b["player1_id"])
-    p2_tg = await get_telegram_id_by_player_id(db, b["player2_id"])
-    await send_upd(p1_tg, b.get("p1_msg_id"), txt1, True)
-    await send_upd(p2_tg, b.get("p2_msg_id"), txt2, False)
+        # Итог раунда рассылает подписчик round_resolved / battle_finished (send_round_result) — в фоне,
+        # после снятия замка боя;
+        # если раунд уже рассчитан параллельным подтверждением соперника, commit вернёт None и ничего не опубликует
+        await db.commit_arena_round(b["id"], b["round_number"], hp1_new, hp2_new, logs=logs)
 
 
 @router.callback_query(F.data == "surrender_confirm")
-async def arena_surrender_confirm(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_surrender_confirm(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
-        await callback.message.edit_text("Бой уже завершён.")
         await callback.answer()
+        await _edit_quietly(callback.message, "Бой уже завершён.")
         return
 
-    b = await db.surrender_battle(battle["id"], player["id"])
-    p1_tg = await get_telegram_id_by_player_id(db, b["player1_id"])
-    p2_tg = await get_telegram_id_by_player_id(db, b["player2_id"])
-    _arena_selection.pop((player["id"], battle["id"]), None)
-
-    txt = "🏳 <b>Бой завершён сдачей!</b>\n\nОдин из игроков покинул поле боя.\n👉 /arena"
-    for tg_id, msg_id in [(p1_tg, b.get("p1_msg_id")), (p2_tg, b.get("p2_msg_id"))]:
-        if tg_id:
-            try:
-                await callback.bot.edit_message_text(
-                    txt, chat_id=tg_id, message_id=msg_id, reply_markup=None, parse_mode="HTML",
-                )
-            except Exception:
-                await callback.bot.send_message(tg_id, txt, parse_mode="HTML")
+    # Сообщение о сдаче обоим рассылает подписчик battle_finished — в фоне, уже без замка боя
+    # Пока ждали замок, бой мог закончиться нокаутом — тогда surrender_battle вернёт None
+    async with battle_locks.get(battle["id"]):
+        finished = await db.surrender_battle(battle["id"], player["id"])
+    await state_store.delete(_sel_key(player["id"], battle["id"]))
+    if finished is None:
+        await callback.answer()
+        await _edit_quietly(callback.message, "Бой уже завершён.")
+        return
     await callback.answer("Вы сдались.")
 
 
 @router.callback_query(F.data == "surrender")
-async def arena_surrender_ask(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_surrender_ask(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
         await callback.answer("Бой уже завершён.")
         return
@@ -417,23 +488,21 @@ async def arena_surrender_ask(callback: CallbackQuery) -> None:
     builder.button(text="Да, сдаться (поражение)", callback_data="surrender_confirm")
     builder.button(text="Отмена", callback_data="arena_cancel_surrender")
     builder.adjust(1)
-    try:
-        await callback.message.edit_text(
-            "🏳 <b>Сдаться?</b>\n\nВыход = поражение. Ставка уйдёт сопернику (минус комиссия).",
-            reply_markup=builder.as_markup(),
-            parse_mode="HTML",
-        )
-    except Exception:
-        pass
     await callback.answer()
+    await _edit_quietly(
+        callback.message,
+        "🏳 <b>Сдаться?</b>\n\nВыход = поражение. Ставка уйдёт сопернику (минус комиссия).",
+        reply_markup=builder.as_markup(),
+        parse_mode="HTML",
+    )
 
 
 @router.callback_query(F.data == "arena_cancel_surrender")
-async def arena_cancel_surrender(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def arena_cancel_surrender(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    battle = await db.get_active_battle_for_player(player["id"])
+    battle = await _active_battle(player_ctx)
     if not battle:
         await callback.answer()
         return
@@ -441,13 +510,14 @@ async def arena_cancel_surrender(callback: CallbackQuery) -> None:
     my_hp = battle["player1_hp"] if is_p1 else battle["player2_hp"]
     opp_hp = battle["player2_hp"] if is_p1 else battle["player1_hp"]
     opp_name = (battle["p2_name"] if is_p1 else battle["p1_name"]) or "Соперник"
-    s = await db.get_combat_stats(player["id"], for_arena=True)
-    max_hp = s.get("max_hp", 50)
+    max_hp, opp_max_hp = await _battle_max_hp(battle, is_p1)
     txt = (
         f"⚔ <b>Бой продолжается</b>\n\n"
         f"👤 Вы: {draw_hp_bar(my_hp, max_hp)}\n"
-        f"👤 {opp_name}: {draw_hp_bar(opp_hp)}\n\n"
+        f"👤 {opp_name}: {draw_hp_bar(opp_hp, opp_max_hp)}\n\n"
         "👇 Ваш ход:"
     )
-    await callback.message.edit_text(txt, reply_markup=_arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML")
     await callback.answer("Отменено")
+    await sender.edit_message(
+        callback.message, txt, reply_markup=await _arena_kb(player["id"], battle["id"], battle=battle), parse_mode="HTML",
+    )
@@ -1,6 +1,8 @@
 """
 Inventory: list items, equip/unequip; зелья с кнопкой «Выпить».
 """
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -8,6 +10,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from keyboards import inventory_item_keyboard, inventory_list_keyboard
 from database.db import db
+from middlewares.player_context import PlayerContext
 
 router = Router(name="inventory")
 
@@ -47,12 +50,12 @@ def _inv_lines(items: list[dict]) -> list[str]:
 
 @router.message(F.text == "🎒 Инвентарь")
 @router.message(Command("inv"))
-async def inv_list(message: Message) -> None:
-    player = await db.get_player_by_telegram_id(message.from_user.id if message.from_user else 0)
+async def inv_list(message: Message, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await message.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await message.answer(
             "🛑 <b>Вы в бою!</b>\n\nСначала завершите поединок (выход = поражение).",
             parse_mode="HTML",
@@ -99,17 +102,17 @@ async def inv_list(message: Message) -> None:
 
 
 @router.callback_query(F.data.startswith("potion_drink_"))
-async def potion_drink(callback: CallbackQuery) -> None:
+async def potion_drink(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
     try:
         item_id = int(callback.data.split("_")[-1])
     except ValueError:
         await callback.answer("Ошибка")
         return
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 В бою зелье нельзя пить из инвентаря. Используйте кнопку «🧪 Хил» (только Бинты).", show_alert=True)
         return
     ok, msg = await db.use_potion(player["id"], item_id)
@@ -145,13 +148,13 @@ async def potion_drink(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("inv_equip_"))
-async def inv_equip(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def inv_equip(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
 
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
 
@@ -175,13 +178,13 @@ async def inv_equip(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("inv_unequip_"))
-async def inv_unequip(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def inv_unequip(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
 
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
 
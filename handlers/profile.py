@@ -1,13 +1,16 @@
 """
 Profile: show stats, upgrade with free_points, выбор класса при 2+ уровне.
 """
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 
 from keyboards import main_menu, profile_upgrade_keyboard, profile_upgrade_keyboard_with_top
-from database.db import db  
+from database.db import db
+from middlewares.player_context import PlayerContext
 
 router = Router(name="profile")
 
@@ -51,12 +54,12 @@ def class_choice_keyboard():
 
 @router.message(F.text == "📋 Профиль")
 @router.message(Command("profile"))
-async def profile_menu(message: Message) -> None:
-    player = await db.get_player_by_telegram_id(message.from_user.id if message.from_user else 0)
+async def profile_menu(message: Message, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await message.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await message.answer(
             "🛑 <b>Вы в бою!</b>\n\nСначала завершите поединок (выход = поражение).",
             parse_mode="HTML",
@@ -87,8 +90,8 @@ async def profile_menu(message: Message) -> None:
 
 
 @router.callback_query(F.data.startswith("class_"))
-async def profile_class_choice(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def profile_class_choice(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
@@ -116,12 +119,12 @@ async def profile_class_choice(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("stat_"))
-async def profile_upgrade(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def profile_upgrade(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
     if callback.data == "stat_strength":
@@ -140,8 +143,7 @@ async def profile_upgrade(callback: CallbackQuery) -> None:
         await callback.answer("Нет свободных очков")
         return
     stats = await db.get_combat_stats(player["id"])
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
-    player_class = player.get("player_class") if player else None
+    player_class = player_ctx.player_class
     await callback.message.edit_text(
         format_stats(stats, player_class),
         reply_markup=profile_upgrade_keyboard_with_top(),
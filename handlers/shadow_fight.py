@@ -1,7 +1,8 @@
 """
 Бой с тенью: шахматка (Атака/Защита), лог с чёрным юмором, восстановление HP после боя.
 """
-import random
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -9,11 +10,18 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from keyboards import shadow_move_keyboard, ZONE_NAMES
 from services.battle_phrases import get_victory_phrase, get_defeat_phrase
+from services.rng import combat_rng, fight_seed
+from services.state_store import state_store
+from services.sender import sender
 from database.db import db
+from middlewares.player_context import PlayerContext
 
 router = Router(name="shadow_fight")
 
-_shadow_selection: dict[int, dict] = {}  # player_id -> {"atk": int|None, "def": int|None}
+
+def _sel_key(player_id: int) -> str:
+    """Ключ выбора зон в state_store: {"atk": int|None, "def": int|None}."""
+    return f"shadow:{player_id}"
 
 
 def _shadow_max_hp(player_max_hp: int) -> int:
@@ -34,8 +42,17 @@ def draw_hp_bar(current: int, max_hp: int = 40, length: int = 8) -> str:
 SHADOW_BANDAGE_LIMIT = 2
 
 
-def _shadow_kb(player_id: int, fight: dict | None = None):
-    sel = _shadow_selection.get(player_id, {})
+async def _active_shadow(ctx: PlayerContext) -> Optional[dict]:
+    """Активный бой с тенью из контекста запроса (выборка по PK)."""
+    if ctx.shadow_fight_id is None:
+        return None
+    fight = await db.get_shadow_fight(ctx.shadow_fight_id)
+    return fight if fight and not fight["is_finished"] else None
+
+
+async def _shadow_kb(player_id: int, fight: dict | None = None, sel: dict | None = None):
+    if sel is None:
+        sel = await state_store.get(_sel_key(player_id)) or {}
     bandage_remaining = None
     if fight is not None:
         used = fight.get("bandage_uses", 0) or 0
@@ -45,21 +62,21 @@ def _shadow_kb(player_id: int, fight: dict | None = None):
 
 @router.message(F.text == "👥 Бой с тенью")
 @router.message(Command("shadow"))
-async def shadow_menu(message: Message) -> None:
-    player = await db.get_player_by_telegram_id(message.from_user.id if message.from_user else 0)
+async def shadow_menu(message: Message, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await message.answer("Сначала /start")
         return
-    if await db.has_trauma(player["id"]):
+    if player_ctx.has_trauma:
         await message.answer(
             "🛑 <b>Вы ранены!</b>\n\nПодождите или выпейте эликсир (Инвентарь → Зелья → Выпить).",
             parse_mode="HTML",
         )
         return
 
-    active = await db.get_active_shadow_fight(player["id"])
+    active = await _active_shadow(player_ctx)
     if active:
-        stats = await db.get_combat_stats(player["id"])
+        stats = await db.get_derived_stats(player["id"])
         max_hp = stats.get("max_hp", 40)
         shadow_max = _shadow_max_hp(max_hp)
         txt = (
@@ -72,7 +89,7 @@ async def shadow_menu(message: Message) -> None:
             await message.delete()
         except Exception:
             pass
-        await message.answer(txt, reply_markup=_shadow_kb(player["id"], active), parse_mode="HTML")
+        await message.answer(txt, reply_markup=await _shadow_kb(player["id"], active), parse_mode="HTML")
         return
 
     txt = (
@@ -91,15 +108,15 @@ def shadow_start_keyboard():
 
 
 @router.callback_query(F.data == "shadow_start")
-async def shadow_start(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shadow_start(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_trauma(player["id"]):
+    if player_ctx.has_trauma:
         await callback.answer("🛑 Вы ранены! Подождите или выпейте эликсир.", show_alert=True)
         return
-    active = await db.get_active_shadow_fight(player["id"])
+    active = await _active_shadow(player_ctx)
     if active:
         await callback.answer("У вас уже есть активный бой с тенью.")
         return
@@ -107,7 +124,7 @@ async def shadow_start(callback: CallbackQuery) -> None:
     if not fight:
         await callback.answer("Ошибка создания боя")
         return
-    stats = await db.get_combat_stats(player["id"])
+    stats = await db.get_derived_stats(player["id"])
     max_hp = stats.get("max_hp", 40)
     shadow_max = _shadow_max_hp(max_hp)
     txt = (
@@ -116,51 +133,51 @@ async def shadow_start(callback: CallbackQuery) -> None:
         f"👻 Тень: {draw_hp_bar(fight['shadow_hp'], shadow_max)}\n\n"
         "👇 Выберите зону атаки и защиты:"
     )
-    await callback.message.edit_text(txt, reply_markup=_shadow_kb(player["id"], fight), parse_mode="HTML")
     await callback.answer("Бой начат!")
+    await sender.edit_message(callback.message, txt, reply_markup=await _shadow_kb(player["id"], fight), parse_mode="HTML")
 
 
 @router.callback_query(F.data.startswith("shadow_atk_"))
 @router.callback_query(F.data.startswith("shadow_def_"))
-async def shadow_select_zone(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shadow_select_zone(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    fight = await db.get_active_shadow_fight(player["id"])
+    fight = await _active_shadow(player_ctx)
     if not fight:
         await callback.answer("Нет активного боя с тенью.")
         return
 
-    _shadow_selection.setdefault(player["id"], {"atk": None, "def": None})
     parts = callback.data.split("_")
     zone = int(parts[-1])
-    if callback.data.startswith("shadow_atk_"):
-        _shadow_selection[player["id"]]["atk"] = zone
-    else:
-        _shadow_selection[player["id"]]["def"] = zone
+    field = "atk" if callback.data.startswith("shadow_atk_") else "def"
+    sel = await state_store.merge(_sel_key(player["id"]), {field: zone})
 
-    stats = await db.get_combat_stats(player["id"])
+    stats = await db.get_derived_stats(player["id"])
     max_hp = stats.get("max_hp", 40)
     shadow_max = _shadow_max_hp(max_hp)
-    sel = _shadow_selection[player["id"]]
     txt = (
         f"👥 <b>Бой с тенью</b>\n\n"
         f"👤 Вы: {draw_hp_bar(fight['player_hp'], max_hp)}\n"
         f"👻 Тень: {draw_hp_bar(fight['shadow_hp'], shadow_max)}\n\n"
-        f"Атака: {ZONE_NAMES.get(sel['atk'], '—')} | Защита: {ZONE_NAMES.get(sel['def'], '—')}\n\n"
+        f"Атака: {ZONE_NAMES.get(sel.get('atk'), '—')} | Защита: {ZONE_NAMES.get(sel.get('def'), '—')}\n\n"
         "👇 Подтвердите удар или нажмите «Автобой»:"
     )
-    await callback.message.edit_text(txt, reply_markup=_shadow_kb(player["id"], fight), parse_mode="HTML")
+    # Быстрые нажатия по зонам схлопываются в одну правку (последний выбор)
     await callback.answer()
+    await sender.edit_message(
+        callback.message, txt, reply_markup=await _shadow_kb(player["id"], fight, sel), parse_mode="HTML",
+        fallback_send=False,
+    )
 
 
 @router.callback_query(F.data == "shadow_heal")
-async def shadow_heal(callback: CallbackQuery) -> None:
+async def shadow_heal(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
     """Free Action: зелье 1 раз за бой, не тратит ход. Обновляем HP и оставляем клавиатуру."""
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    fight = await db.get_active_shadow_fight(player["id"])
+    fight = await _active_shadow(player_ctx)
     if not fight:
         await callback.answer("Нет активного боя с тенью.")
         return
@@ -169,9 +186,10 @@ async def shadow_heal(callback: CallbackQuery) -> None:
         await callback.answer(msg, show_alert=True)
         return
     await callback.answer(msg)
-    fight = await db.get_active_shadow_fight(player["id"])
-    stats = await db.get_combat_stats(player["id"])
+    fight = await _active_shadow(player_ctx)
+    stats = await db.get_derived_stats(player["id"])
     max_hp = stats.get("max_hp", 40)
+    shadow_max = _shadow_max_hp(max_hp)
     txt = (
         f"👥 <b>Бой с тенью</b>\n\n"
         f"🧪 {msg}\n\n"
@@ -179,38 +197,32 @@ async def shadow_heal(callback: CallbackQuery) -> None:
         f"👻 Тень: {draw_hp_bar(fight['shadow_hp'], shadow_max)}\n\n"
         "👇 Выберите зону атаки и защиты (ход не потрачен):"
     )
-    try:
-        await callback.message.edit_text(
-            txt,
-            reply_markup=_shadow_kb(player["id"], fight),
-            parse_mode="HTML",
-        )
-    except Exception:
-        await callback.message.answer(txt, reply_markup=_shadow_kb(player["id"], fight), parse_mode="HTML")
+    await sender.edit_message(callback.message, txt, reply_markup=await _shadow_kb(player["id"], fight), parse_mode="HTML")
 
 
 @router.callback_query(F.data == "shadow_confirm")
 @router.callback_query(F.data == "shadow_auto")
-async def shadow_confirm_move(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shadow_confirm_move(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         return
-    fight = await db.get_active_shadow_fight(player["id"])
+    fight = await _active_shadow(player_ctx)
     if not fight:
         await callback.answer("Нет активного боя с тенью.")
         return
 
     if callback.data == "shadow_auto":
-        atk, blk = random.randint(1, 3), random.randint(1, 3)
+        auto = combat_rng(fight_seed(fight), fight["round"], "auto")
+        atk, blk = auto.randint(1, 3), auto.randint(1, 3)
     else:
-        sel = _shadow_selection.get(player["id"], {})
+        sel = await state_store.get(_sel_key(player["id"])) or {}
         atk, blk = sel.get("atk"), sel.get("def")
         if atk is None or blk is None:
             await callback.answer("Выберите зону атаки и зону защиты.", show_alert=True)
             return
 
     updated, stats, log_lines, player_won, leveled_up, gold_given, xp_given = await db.process_shadow_turn(fight["id"], atk, blk)
-    _shadow_selection.pop(player["id"], None)
+    await state_store.delete(_sel_key(player["id"]))
 
     if not updated:
         await callback.answer("Бой уже завершён.")
@@ -228,28 +240,19 @@ async def shadow_confirm_move(callback: CallbackQuery) -> None:
             result = f"🏆 <b>ПОБЕДА!</b>\n{get_victory_phrase()}\n💰 +{gold_given} кр. | 📊 +{xp_given} опыта{lvl_banner}\n👉 /shadow"
         else:
             result = f"💀 <b>ПОРАЖЕНИЕ.</b>\n{get_defeat_phrase()}\n💰 +{gold_given} кр. | 📊 +{xp_given} опыта{lvl_banner}\n👉 /shadow"
-        try:
-            await callback.message.edit_text(
-                f"👥 <b>Раунд {updated['round']}</b>\n{log_str}\n\n"
-                f"👤 Вы: {bar_player}\n👻 Тень: {bar_shadow}\n\n{result}",
-                reply_markup=None,
-                parse_mode="HTML",
-            )
-        except Exception:
-            await callback.message.answer(
-                f"👥 <b>Раунд {updated['round']}</b>\n{log_str}\n\n"
-                f"👤 Вы: {bar_player}\n👻 Тень: {bar_shadow}\n\n{result}",
-                parse_mode="HTML",
-            )
         await callback.answer("Бой завершён" if player_won else "Вы проиграли")
+        await sender.edit_message(
+            callback.message,
+            f"👥 <b>Раунд {updated['round']}</b>\n{log_str}\n\n"
+            f"👤 Вы: {bar_player}\n👻 Тень: {bar_shadow}\n\n{result}",
+            reply_markup=None,
+            parse_mode="HTML",
+        )
         return
 
     txt = (
         f"👥 <b>Раунд {updated['round']}</b>\n{log_str}\n\n"
         f"👤 Вы: {bar_player}\n👻 Тень: {bar_shadow}\n\n👇 Ваш ход:"
     )
-    try:
-        await callback.message.edit_text(txt, reply_markup=_shadow_kb(player["id"], updated), parse_mode="HTML")
-    except Exception:
-        await callback.message.answer(txt, reply_markup=_shadow_kb(player["id"], updated), parse_mode="HTML")
     await callback.answer("Ход принят")
+    await sender.edit_message(callback.message, txt, reply_markup=await _shadow_kb(player["id"], updated, {}), parse_mode="HTML")
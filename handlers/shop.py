@@ -2,6 +2,8 @@
 Shop: каталог по категориям — Оружие, Одежда, Эликсиры. Пагинация по уровням (1–5) для оружия и одежды.
 """
 import re
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -13,6 +15,7 @@ from keyboards import (
     shop_elixirs_keyboard,
 )
 from database.db import db
+from middlewares.player_context import PlayerContext
 
 router = Router(name="shop")
 
@@ -89,12 +92,12 @@ def _parse_shop_context_from_text(text: str | None) -> tuple[str | None, int | N
 
 @router.message(F.text == "🛒 Магазин")
 @router.message(Command("shop"))
-async def shop_menu(message: Message) -> None:
-    player = await db.get_player_by_telegram_id(message.from_user.id if message.from_user else 0)
+async def shop_menu(message: Message, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await message.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await message.answer(
             "🛑 <b>Вы в бою!</b>\n\nСначала завершите поединок (выход = поражение).",
             parse_mode="HTML",
@@ -110,9 +113,9 @@ async def shop_menu(message: Message) -> None:
 
 
 @router.callback_query(F.data == "shop_cat:main")
-async def shop_cat_main(callback: CallbackQuery) -> None:
+async def shop_cat_main(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
     """Возврат в главное меню магазина."""
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
@@ -127,12 +130,12 @@ async def shop_cat_main(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("shop_cat:weapons:lvl:"))
-async def shop_cat_weapons(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shop_cat_weapons(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою!", show_alert=True)
         return
     try:
@@ -140,9 +143,7 @@ async def shop_cat_weapons(callback: CallbackQuery) -> None:
     except (ValueError, IndexError):
         level = 1
     level = max(1, min(level, SHOP_MAX_LEVEL))
-    all_items = await db.get_shop_items()
-    items = db.get_shop_items_by_category(all_items, "weapons")
-    items_level = [i for i in items if (i.get("min_level") or 1) == level]
+    items_level = db.get_shop_view("weapons", level)
     stats = await db.get_combat_stats(player["id"])
     credits = stats.get("credits", 0)
     text = _category_level_text(items_level, credits, "⚔️ ОРУЖИЕ", level, is_elixirs=False)
@@ -153,12 +154,12 @@ async def shop_cat_weapons(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("shop_cat:armor:lvl:"))
-async def shop_cat_armor(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shop_cat_armor(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою!", show_alert=True)
         return
     try:
@@ -166,9 +167,7 @@ async def shop_cat_armor(callback: CallbackQuery) -> None:
     except (ValueError, IndexError):
         level = 1
     level = max(1, min(level, SHOP_MAX_LEVEL))
-    all_items = await db.get_shop_items()
-    items = db.get_shop_items_by_category(all_items, "armor")
-    items_level = [i for i in items if (i.get("min_level") or 1) == level]
+    items_level = db.get_shop_view("armor", level)
     stats = await db.get_combat_stats(player["id"])
     credits = stats.get("credits", 0)
     text = _category_level_text(items_level, credits, "🛡️ ОДЕЖДА", level, is_elixirs=False)
@@ -179,16 +178,15 @@ async def shop_cat_armor(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data == "shop_cat:elixirs")
-async def shop_cat_elixirs(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shop_cat_elixirs(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою!", show_alert=True)
         return
-    all_items = await db.get_shop_items()
-    items = db.get_shop_items_by_category(all_items, "elixirs")
+    items = db.get_shop_view("elixirs")
     stats = await db.get_combat_stats(player["id"])
     credits = stats.get("credits", 0)
     text = _elixirs_text(items, credits)
@@ -198,9 +196,9 @@ async def shop_cat_elixirs(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("shop_item_"))
-async def shop_item_view(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
-    if player and await db.has_active_fight(player["id"]):
+async def shop_item_view(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
+    if player and player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
     try:
@@ -243,12 +241,12 @@ async def shop_item_view(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("shop_buy_"))
-async def shop_buy(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shop_buy(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
     try:
@@ -270,8 +268,7 @@ async def shop_buy(callback: CallbackQuery) -> None:
                 parse_mode="HTML",
             )
         elif cat == "elixirs":
-            all_items = await db.get_shop_items()
-            items = db.get_shop_items_by_category(all_items, "elixirs")
+            items = db.get_shop_view("elixirs")
             await callback.message.edit_text(
                 _elixirs_text(items, credits) + "\n\n✅ " + msg,
                 reply_markup=shop_elixirs_keyboard(items),
@@ -280,9 +277,7 @@ async def shop_buy(callback: CallbackQuery) -> None:
         else:
             level = lvl or 1
             level = max(1, min(level, SHOP_MAX_LEVEL))
-            all_items = await db.get_shop_items()
-            items = db.get_shop_items_by_category(all_items, cat)
-            items_level = [i for i in items if (i.get("min_level") or 1) == level]
+            items_level = db.get_shop_view(cat, level)
             label = "⚔️ ОРУЖИЕ" if cat == "weapons" else "🛡️ ОДЕЖДА"
             text = _category_level_text(items_level, credits, label, level, is_elixirs=False)
             text = "🛒 <b>Магазин</b>\n\n" + text + "\n\n✅ " + msg
@@ -293,12 +288,12 @@ async def shop_buy(callback: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data.startswith("shop_sell_"))
-async def shop_sell(callback: CallbackQuery) -> None:
-    player = await db.get_player_by_telegram_id(callback.from_user.id if callback.from_user else 0)
+async def shop_sell(callback: CallbackQuery, player_ctx: Optional[PlayerContext]) -> None:
+    player = player_ctx.player if player_ctx else None
     if not player:
         await callback.answer("Сначала /start")
         return
-    if await db.has_active_fight(player["id"]):
+    if player_ctx.in_fight:
         await callback.answer("🛑 Вы в бою! Сначала завершите поединок (выход = поражение).", show_alert=True)
         return
     try:
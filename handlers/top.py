@@ -1,19 +1,21 @@
 """
-Глобальный рейтинг: ТОП-10 и ТОП-100 с пагинацией. TON FIGHT CLUB.
+Глобальный рейтинг: ТОП-10 и доски ТОП-100 с пагинацией (уровень, классы, богачи, победы). TON FIGHT CLUB.
+Страницы берутся из снимков services/leaderboard.py; глубже ТОП-100 — keyset-пагинация.
 """
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from database.db import db
+from services.leaderboard import leaderboard, BOARD_TITLES, Page
 
 router = Router(name="top")
 
 SERVER_NAME = "TON FIGHT CLUB"
 TOP10_LIMIT = 10
-TOP100_LIMIT = 100
-TOP100_PAGE_SIZE = 25
 
 
 def _display_name(name: str) -> str:
@@ -34,25 +36,33 @@ def _top10_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def _top100_pagination_keyboard(page: int, total_pages: int) -> InlineKeyboardMarkup:
+def _cursor_data(board: str, page: int, cursor: tuple) -> str:
+    """lbk_<доска>_<страница>_<ключ через точку> — укладывается в 64 байта callback_data."""
+    return f"lbk_{board}_{page}_" + ".".join(str(v) for v in cursor)
+
+
+def _board_keyboard(board: str, pg: Page) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    if total_pages <= 1:
-        builder.row(
-            InlineKeyboardButton(text="◀️ ТОП-10", callback_data="show_top"),
-        )
-        return builder.as_markup()
     row = []
-    if page > 1:
-        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"top100_page_{page - 1}"))
-    row.append(
-        InlineKeyboardButton(
-            text=f"📜 ТОП-100 ({page}/{total_pages})",
-            callback_data="noop",
-        )
-    )
-    if page < total_pages:
-        row.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"top100_page_{page + 1}"))
+    if pg.page > 1:
+        # Назад — только в пределах снимка; из keyset-страниц возврат в начало
+        if pg.start - leaderboard.page_size <= leaderboard.depth:
+            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"lb_{board}_{pg.page - 1}"))
+        else:
+            row.append(InlineKeyboardButton(text="⏮ В начало", callback_data=f"lb_{board}_1"))
+    row.append(InlineKeyboardButton(text=f"📜 стр. {pg.page}", callback_data="noop"))
+    if pg.has_next:
+        data = _cursor_data(board, pg.page + 1, pg.next_cursor) if pg.next_cursor else f"lb_{board}_{pg.page + 1}"
+        row.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=data))
     builder.row(*row)
+    for boards in (("level", "rich", "wins"), ("rogue", "tank", "warrior")):
+        builder.row(*[
+            InlineKeyboardButton(
+                text=("• " if b == board else "") + BOARD_TITLES[b],
+                callback_data=f"lb_{b}_1",
+            )
+            for b in boards
+        ])
     builder.row(InlineKeyboardButton(text="◀️ ТОП-10", callback_data="show_top"))
     return builder.as_markup()
 
@@ -67,40 +77,57 @@ async def _get_player_rank_text(telegram_id: int) -> str:
     return f"Ваше место в рейтинге: #{rank}"
 
 
+def _row_score(board: str, p: dict) -> str:
+    if board == "rich":
+        return f"{p.get('credits', 0)} кр."
+    if board == "wins":
+        return f"{p.get('arena_wins', 0)} побед"
+    cls = p.get("class_name") or "Без класса"
+    return f"Lvl {p.get('level', 0)} ({cls})"
+
+
 def _build_top10_text(leaders: list[dict], rank_line: str) -> str:
     lines = [f"🏆 <b>ЗАЛ СЛАВЫ {SERVER_NAME} (TOP-10)</b>\n"]
     medals = {1: "🥇", 2: "🥈", 3: "🥉"}
     for i, p in enumerate(leaders, 1):
         icon = medals.get(i, "🎖")
         name = _display_name(p.get("name") or "Игрок")
-        lvl = p.get("level", 0)
-        cls = p.get("class_name") or "Без класса"
-        lines.append(f"{i}. {icon} {name} | Lvl {lvl} ({cls})")
+        lines.append(f"{i}. {icon} {name} | {_row_score('level', p)}")
     lines.append("----------------------")
     lines.append(rank_line)
     return "\n".join(lines)
 
 
-def _build_top100_page_text(leaders: list[dict], page: int, total_pages: int, rank_line: str) -> str:
-    start = (page - 1) * TOP100_PAGE_SIZE
-    chunk = leaders[start : start + TOP100_PAGE_SIZE]
-    lines = [f"🏆 <b>ЗАЛ СЛАВЫ {SERVER_NAME} — ТОП-100</b> (стр. {page}/{total_pages})\n"]
+def _build_board_page_text(board: str, pg: Page, rank_line: str) -> str:
+    lines = [f"🏆 <b>ЗАЛ СЛАВЫ {SERVER_NAME} — {BOARD_TITLES[board]}</b> (стр. {pg.page})\n"]
     medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-    for idx, p in enumerate(chunk, start=start + 1):
+    for idx, p in enumerate(pg.rows, start=pg.start):
         icon = medals.get(idx, "🎖")
         name = _display_name(p.get("name") or "Игрок")
-        lvl = p.get("level", 0)
-        cls = p.get("class_name") or "Без класса"
-        lines.append(f"{idx}. {icon} {name} | Lvl {lvl} ({cls})")
+        lines.append(f"{idx}. {icon} {name} | {_row_score(board, p)}")
+    if not pg.rows:
+        lines.append("Здесь пока никого нет.")
     lines.append("----------------------")
     lines.append(rank_line)
     return "\n".join(lines)
 
 
+async def _show_board(callback: CallbackQuery, board: str, page: int, cursor: Optional[tuple] = None) -> None:
+    telegram_id = callback.from_user.id if callback.from_user else 0
+    pg = await leaderboard.page(board, page, cursor)
+    rank_line = await _get_player_rank_text(telegram_id)
+    text = _build_board_page_text(board, pg, rank_line)
+    kb = _board_keyboard(board, pg)
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except Exception:
+        await callback.message.answer(text, reply_markup=kb)
+
+
 @router.message(F.text == "🏆 Топ игроков")
 @router.message(Command("top"))
 async def cmd_top(message: Message) -> None:
-    leaders = await db.get_leaderboard(TOP10_LIMIT)
+    leaders = await leaderboard.top("level", TOP10_LIMIT)
     rank_line = await _get_player_rank_text(message.from_user.id if message.from_user else 0)
     if not leaders:
         await message.answer(
@@ -116,7 +143,7 @@ async def cmd_top(message: Message) -> None:
 async def cb_show_top(callback: CallbackQuery) -> None:
     await callback.answer()
     telegram_id = callback.from_user.id if callback.from_user else 0
-    leaders = await db.get_leaderboard(TOP10_LIMIT)
+    leaders = await leaderboard.top("level", TOP10_LIMIT)
     rank_line = await _get_player_rank_text(telegram_id)
     if not leaders:
         await callback.message.edit_text(
@@ -134,37 +161,44 @@ async def cb_show_top(callback: CallbackQuery) -> None:
 @router.callback_query(F.data == "show_top100")
 async def cb_show_top100(callback: CallbackQuery) -> None:
     await callback.answer()
-    telegram_id = callback.from_user.id if callback.from_user else 0
-    leaders = await db.get_leaderboard(TOP100_LIMIT)
-    rank_line = await _get_player_rank_text(telegram_id)
-    total_pages = max(1, (len(leaders) + TOP100_PAGE_SIZE - 1) // TOP100_PAGE_SIZE)
-    page = 1
-    text = _build_top100_page_text(leaders, page, total_pages, rank_line)
-    kb = _top100_pagination_keyboard(page, total_pages)
-    try:
-        await callback.message.edit_text(text, reply_markup=kb)
-    except Exception:
-        await callback.message.answer(text, reply_markup=kb)
+    await _show_board(callback, "level", 1)
 
 
 @router.callback_query(F.data.startswith("top100_page_"))
 async def cb_top100_page(callback: CallbackQuery) -> None:
+    """Кнопки старых сообщений (до появления досок) — доска «Уровень»."""
     await callback.answer()
     try:
         page = int(callback.data.replace("top100_page_", ""))
     except ValueError:
         page = 1
-    telegram_id = callback.from_user.id if callback.from_user else 0
-    leaders = await db.get_leaderboard(TOP100_LIMIT)
-    rank_line = await _get_player_rank_text(telegram_id)
-    total_pages = max(1, (len(leaders) + TOP100_PAGE_SIZE - 1) // TOP100_PAGE_SIZE)
-    page = max(1, min(page, total_pages))
-    text = _build_top100_page_text(leaders, page, total_pages, rank_line)
-    kb = _top100_pagination_keyboard(page, total_pages)
+    await _show_board(callback, "level", page)
+
+
+@router.callback_query(F.data.startswith("lb_"))
+async def cb_board_page(callback: CallbackQuery) -> None:
+    await callback.answer()
+    parts = callback.data.split("_")
+    board = parts[1] if len(parts) > 1 and parts[1] in BOARD_TITLES else "level"
     try:
-        await callback.message.edit_text(text, reply_markup=kb)
-    except Exception:
-        await callback.message.answer(text, reply_markup=kb)
+        page = int(parts[2])
+    except (IndexError, ValueError):
+        page = 1
+    await _show_board(callback, board, page)
+
+
+@router.callback_query(F.data.startswith("lbk_"))
+async def cb_board_keyset(callback: CallbackQuery) -> None:
+    await callback.answer()
+    parts = callback.data.split("_")
+    try:
+        board, page = parts[1], int(parts[2])
+        cursor = tuple(int(v) for v in parts[3].split("."))
+    except (IndexError, ValueError):
+        board, page, cursor = "level", 1, None
+    if board not in BOARD_TITLES:
+        board, page, cursor = "level", 1, None
+    await _show_board(callback, board, page, cursor)
 
 
 @router.callback_query(F.data == "noop")
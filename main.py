@@ -13,9 +13,20 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
 
 from database.db import db
 from handlers import start, profile, shadow_fight, arena, inventory, shop, top, admin, help
+from services.matchmaking import Matchmaker
+from services.scheduler import Scheduler
+from services.leaderboard import leaderboard
+from services.state_store import state_store
+from services.routing import HashRing, UpdateRouter
+from services.events import EventBus, LocalEventBus, PgEventBus
+from services.sender import sender
+from services.win_solver import win_solver
+from middlewares.player_context import PlayerContextMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,19 +34,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Проверяется в main(): build_dispatcher и прочее импортируются без токена (benchmarks/loadgen.py)
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise ValueError("Set BOT_TOKEN in .env")
 
+# Получение апдейтов: polling (по умолчанию, для разработки), webhook (встроенный aiohttp-сервер)
+# или router + worker — несколько процессов за одним вебхуком (services/routing.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Webhook: публичный URL (https://host[:port]) + путь, секрет (заголовок X-Telegram-Bot-Api-Secret-Token),
+# адрес сервера и максимум одновременных апдейтов (max_connections в setWebhook, 1–100)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "40"))
+# Роутер: адреса воркеров через запятую (http://worker1:8081,http://worker2:8082), апдейт принимают на WEBHOOK_PATH
+WORKER_URLS = [u.strip().rstrip("/") for u in os.getenv("WORKER_URLS", "").split(",") if u.strip()]
+# События боёв (services/events.py): local — в процессе, postgres — LISTEN/NOTIFY между процессами.
+# Воркер доставляет сообщения только своим игрокам: WORKER_SELF_URL — его адрес из WORKER_URLS
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "postgres" if BOT_MODE == "worker" else "local")
+WORKER_SELF_URL = os.getenv("WORKER_SELF_URL", "").rstrip("/")
 
-async def main() -> None:
-    bot = Bot(
-        token=BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
+# Подбор соперников арены в памяти процесса (services/matchmaking.py); 0 — подбор при входе в очередь через БД
+MATCHMAKER_ENABLED = os.getenv("MATCHMAKER_ENABLED", "0") == "1"
+# Подбор по равенству шансов (services/win_solver.py на numpy) среди давних ожидающих соседних уровней —
+# и в matchmaker, и при входе в очередь через БД (там из MATCH_CANDIDATES давних, читает database/db.py)
+MATCH_FAIRNESS = os.getenv("MATCH_FAIRNESS", "1") == "1"
+# Фоновые задачи: интервал очистки зависших боёв/очереди (сек) и возраст, после которого бой считается зависшим (мин)
+STALE_SWEEP_INTERVAL = float(os.getenv("STALE_SWEEP_INTERVAL", "60"))
+STALE_BATTLE_MINUTES = int(os.getenv("STALE_BATTLE_MINUTES", "15"))
+# Перестройка индекса рейтинга в памяти (сек) — подхватывает опыт, начисленный другими процессами
+RANK_INDEX_REFRESH = float(os.getenv("RANK_INDEX_REFRESH", "300"))
+# Обновление снимков досок рейтинга (сек)
+LEADERBOARD_REFRESH = float(os.getenv("LEADERBOARD_REFRESH", "30"))
+# Перечитывание каталога предметов (сек) — подхватывает предметы, созданные админом в другом процессе
+CATALOG_REFRESH = float(os.getenv("CATALOG_REFRESH", "600"))
+# Очистка просроченного выбора зон (services/state_store.py), сек
+STATE_PURGE_INTERVAL = float(os.getenv("STATE_PURGE_INTERVAL", "300"))
+
+
+def build_scheduler(matchmaker: Matchmaker | None) -> Scheduler:
+    scheduler = Scheduler(db)
+
+    async def sweep_stale() -> None:
+        closed, refunded = await db.close_stale_battles(STALE_BATTLE_MINUTES)
+        if matchmaker:
+            for player_id in refunded:
+                matchmaker.remove(player_id)
+        if closed or refunded:
+            logger.info("Stale sweep: %s battles closed, %s queue stakes refunded", closed, len(refunded))
+
+    scheduler.add("stale_sweep", sweep_stale, interval=STALE_SWEEP_INTERVAL)
+    scheduler.add("rank_index_refresh", db.load_rank_index, interval=RANK_INDEX_REFRESH, leader_only=False)
+    scheduler.add("leaderboard_refresh", leaderboard.refresh, interval=LEADERBOARD_REFRESH, leader_only=False)
+    scheduler.add("catalog_refresh", db.load_catalog, interval=CATALOG_REFRESH, leader_only=False)
+    scheduler.add("state_purge", state_store.purge_expired, interval=STATE_PURGE_INTERVAL, leader_only=state_store.shared)
+    return scheduler
+
+
+def check_worker_settings() -> None:
+    """
+    BOT_MODE=worker: выбор зон, ход и бой игрока могут обрабатываться разными воркерами, поэтому всё
+    состояние боёв — только в БД. Состояние в памяти процесса (выбор зон, реестр боёв, очередь подбора,
+    кэш статов, кэш контекста игрока) у соседнего воркера устаревает молча — такие настройки не запускаем.
+    """
+    problems = []
+    if os.getenv("STATE_STORE", "memory") != "postgres":
+        problems.append("STATE_STORE=postgres")
+    if os.getenv("FIGHT_REGISTRY_ENABLED", "1") != "0":
+        problems.append("FIGHT_REGISTRY_ENABLED=0")
+    if MATCHMAKER_ENABLED:
+        problems.append("MATCHMAKER_ENABLED=0")
+    if int(os.getenv("COMBAT_STATS_CACHE_SIZE", "10000")) > 0:
+        problems.append("COMBAT_STATS_CACHE_SIZE=0")
+    if float(os.getenv("PLAYER_CTX_TTL", "2")) > 0:
+        problems.append("PLAYER_CTX_TTL=0")
+    if problems:
+        raise ValueError(f"Set {', '.join(problems)} in .env for BOT_MODE=worker")
+
+
+def build_event_bus() -> EventBus:
+    bus_kwargs = {}
+    if BOT_MODE == "worker":
+        if WORKER_SELF_URL not in WORKER_URLS:
+            raise ValueError("Set WORKER_URLS and WORKER_SELF_URL (one of WORKER_URLS) in .env for BOT_MODE=worker")
+        ring = HashRing(WORKER_URLS)
+
+        def owns(telegram_id: int) -> bool:
+            # Тот же ключ, по которому роутер отдаёт апдейты игрока
+            return ring.owner(f"user:{telegram_id}") == WORKER_SELF_URL
+
+        bus_kwargs["owns"] = owns
+    if EVENTS_BACKEND == "postgres":
+        return PgEventBus(db, **bus_kwargs)
+    return LocalEventBus(**bus_kwargs)
+
+
+def build_dispatcher() -> Dispatcher:
+    """Dispatcher с middleware и роутерами — общий для polling, webhook и бенчмарков."""
     dp = Dispatcher()
-    
-    await db.connect()
+
+    # Контекст игрока (player_ctx) — одним запросом на апдейт, после выбора хендлера
+    dp.message.middleware(PlayerContextMiddleware())
+    dp.callback_query.middleware(PlayerContextMiddleware())
 
     dp.include_router(start.router)
     dp.include_router(profile.router)
@@ -46,11 +147,150 @@ async def main() -> None:
     dp.include_router(top.router)
     dp.include_router(admin.router)
     dp.include_router(help.router)
+    return dp
+
+
+async def healthz(request: web.Request) -> web.Response:
+    """Живость процесса и доступность БД — для балансировщика/оркестратора."""
+    try:
+        async with db.pool.acquire(timeout=2) as conn:
+            await conn.fetchval("SELECT 1")
+    except Exception as e:
+        return web.json_response({"status": "fail", "db": repr(e)}, status=503)
+    scheduler = request.app["scheduler"]
+    return web.json_response({"status": "ok", "leader": scheduler.is_leader})
+
+
+async def _serve(app: web.Application) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    return runner
+
+
+async def _set_webhook(bot: Bot, dp: Dispatcher) -> None:
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError(f"Set WEBHOOK_URL and WEBHOOK_SECRET in .env for BOT_MODE={BOT_MODE}")
+    await bot.set_webhook(
+        WEBHOOK_URL + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_IN_FLIGHT,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info("Webhook set to %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+
+
+def _in_flight_limit(limit: int):
+    """aiohttp-middleware: не больше limit апдейтов на WEBHOOK_PATH в работе, остальные запросы ждут."""
+    slots = asyncio.Semaphore(limit)
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path != WEBHOOK_PATH:
+            return await handler(request)
+        async with slots:
+            return await handler(request)
+
+    return middleware
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, register: bool = True) -> None:
+    """
+    aiohttp-сервер: Telegram (или роутер, register=False) присылает апдейты POST-запросами на WEBHOOK_PATH.
+    Апдейт обрабатывается внутри запроса (handle_in_background=False): ответ уходит после хендлера,
+    поэтому Telegram (и роутер, который ждёт ответа воркера) не шлёт следующий апдейт через занятое
+    соединение, а одновременно в работе не больше WEBHOOK_MAX_IN_FLIGHT апдейтов — лишние запросы ждут семафор.
+    """
+    if not WEBHOOK_SECRET:
+        raise ValueError(f"Set WEBHOOK_SECRET in .env for BOT_MODE={BOT_MODE}")
+    app = web.Application(middlewares=[_in_flight_limit(WEBHOOK_MAX_IN_FLIGHT)])
+    app["scheduler"] = dp["scheduler"]
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET, handle_in_background=False,
+    ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/healthz", healthz)
+
+    runner = await _serve(app)
+    try:
+        await dp.emit_startup(bot=bot, dispatcher=dp)
+        if register:
+            await _set_webhook(bot, dp)
+        logger.info("Webhook server on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await asyncio.Event().wait()
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await runner.cleanup()
+
+
+async def run_router(bot: Bot) -> None:
+    """Вход вебхука без обработки апдейтов: пересылка воркерам (BOT_MODE=worker) по консистентному хэшу."""
+    if not WORKER_URLS:
+        raise ValueError("Set WORKER_URLS in .env for BOT_MODE=router")
+    await db.connect(prepare=False)
+    router = UpdateRouter(db, WORKER_URLS, WEBHOOK_SECRET, worker_path=WEBHOOK_PATH)
+    # Конец боя сбрасывает закэшированный battle_id игроков: реванш сразу уходит владельцу нового боя
+    events = PgEventBus(db)
+    router.subscribe_events(events)
+    await events.start()
+    runner = await _serve(router.build_app(WEBHOOK_PATH))
+    try:
+        await _set_webhook(bot, build_dispatcher())
+        logger.info("Router on %s:%s -> %s", WEBHOOK_HOST, WEBHOOK_PORT, ", ".join(WORKER_URLS))
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await events.stop()
+        await db.close()
+        await bot.session.close()
+
+
+async def main() -> None:
+    if not BOT_TOKEN:
+        raise ValueError("Set BOT_TOKEN in .env")
+    bot = Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    if BOT_MODE == "router":
+        await run_router(bot)
+        return
+    if BOT_MODE == "worker":
+        check_worker_settings()
+    dp = build_dispatcher()
+    if not win_solver.available:
+        logger.warning("numpy is not installed: arena win chance and MATCH_FAIRNESS are off (pip install -r requirements.txt)")
+
+    db.events = build_event_bus()
+    arena.subscribe_events(db.events)
+    await sender.start(bot)
+    await db.connect()
+    await db.events.start()
+
+    matchmaker = None
+    if MATCHMAKER_ENABLED:
+        # Сообщения о найденном бое рассылает подписчик match_found
+        matchmaker = Matchmaker(db, fair=MATCH_FAIRNESS)
+        await matchmaker.start()
+        dp["matchmaker"] = matchmaker
+
+    scheduler = build_scheduler(matchmaker)
+    await scheduler.start()
+    dp["scheduler"] = scheduler
 
     try:
-        logger.info("Bot starting...")
-        await dp.start_polling(bot)
+        logger.info("Bot starting (%s)...", BOT_MODE)
+        if BOT_MODE in ("webhook", "worker"):
+            await run_webhook(bot, dp, register=BOT_MODE == "webhook")
+        else:
+            # Вебхук, оставшийся от webhook-режима, не даст работать getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        await scheduler.stop()
+        if matchmaker:
+            await matchmaker.stop()
+        await db.events.stop()
+        await sender.stop()
         await db.close()
         await bot.session.close()
 
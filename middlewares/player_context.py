@@ -0,0 +1,58 @@
+"""
+Контекст игрока на запрос: строка players, активный бой арены / бой с тенью, травма — одним запросом
+(Database.get_player_context, короткий TTL-кэш). Хендлер получает его аргументом player_ctx
+(None — игрок не зарегистрирован) вместо get_player_by_telegram_id + has_trauma + has_active_fight.
+"""
+import datetime
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from database.db import db
+
+
+class PlayerContext(NamedTuple):
+    player: dict  # id, telegram_id, username, player_class
+    level: int
+    trauma_end_at: Optional[datetime.datetime]
+    battle_id: Optional[int]
+    shadow_fight_id: Optional[int]
+
+    @property
+    def id(self) -> int:
+        return self.player["id"]
+
+    @property
+    def player_class(self) -> Optional[str]:
+        return self.player.get("player_class")
+
+    @property
+    def in_fight(self) -> bool:
+        """Есть активный бой на арене или с тенью (как Database.has_active_fight)."""
+        return self.battle_id is not None or self.shadow_fight_id is not None
+
+    @property
+    def has_trauma(self) -> bool:
+        """trauma_end_at ещё не наступил (как Database.has_trauma)."""
+        end = self.trauma_end_at
+        if not end:
+            return False
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=datetime.timezone.utc)
+        return datetime.datetime.now(datetime.timezone.utc) < end
+
+
+class PlayerContextMiddleware(BaseMiddleware):
+    """Inner-middleware (message, callback_query): запрос в БД только если нашёлся хендлер."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        ctx = await db.get_player_context(user.id) if user else None
+        data["player_ctx"] = PlayerContext(**ctx) if ctx else None
+        return await handler(event, data)
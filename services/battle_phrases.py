@@ -64,28 +64,28 @@ PHRASE_DEFEAT = [
 ]
 
 
-def get_hit_phrase() -> str:
-    return random.choice(PHRASE_HIT)
+def get_hit_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_HIT)
 
 
-def get_block_phrase() -> str:
-    return random.choice(PHRASE_BLOCK)
+def get_block_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_BLOCK)
 
 
-def get_crit_phrase() -> str:
-    return random.choice(PHRASE_CRIT)
+def get_crit_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_CRIT)
 
 
-def get_dodge_phrase() -> str:
-    return random.choice(PHRASE_DODGE)
+def get_dodge_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_DODGE)
 
 
-def get_victory_phrase() -> str:
-    return random.choice(PHRASE_VICTORY)
+def get_victory_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_VICTORY)
 
 
-def get_defeat_phrase() -> str:
-    return random.choice(PHRASE_DEFEAT)
+def get_defeat_phrase(rng=random) -> str:
+    return rng.choice(PHRASE_DEFEAT)
 
 
 def build_exchange_line(
@@ -93,13 +93,14 @@ def build_exchange_line(
     defender_name: str,
     outcome: str,  # "block" | "dodge" | "hit" | "crit"
     damage: int = 0,
+    rng=random,
 ) -> str:
-    """Собирает одну строку лога для обмена ударами."""
+    """Собирает одну строку лога для обмена ударами (фраза выбирается потоком rng)."""
     if outcome == "block":
-        return f"{defender_name} {get_block_phrase()}."
+        return f"{defender_name} {get_block_phrase(rng)}."
     if outcome == "dodge":
-        return f"{defender_name} {get_dodge_phrase()} — удар {attacker_name} прошёл мимо."
+        return f"{defender_name} {get_dodge_phrase(rng)} — удар {attacker_name} прошёл мимо."
     if outcome == "crit":
-        return f"{attacker_name} {get_crit_phrase()} ({damage} урона)."
+        return f"{attacker_name} {get_crit_phrase(rng)} ({damage} урона)."
     # hit
-    return f"{attacker_name} {get_hit_phrase()} — {defender_name} получил {damage} урона."
+    return f"{attacker_name} {get_hit_phrase(rng)} — {defender_name} получил {damage} урона."
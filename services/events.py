@@ -0,0 +1,187 @@
+"""
+События боёв арены: Database публикует их после фиксации (match_found, round_resolved, battle_finished),
+а рассылку сообщений игрокам делают подписчики (handlers/arena.py) в процессе, которому принадлежит
+получатель (owns(telegram_id)). Событие — имя + небольшой dict, в нём всегда есть "recipients" — telegram_id.
+LocalEventBus — в пределах процесса (один процесс бота, тесты); PgEventBus — через LISTEN/NOTIFY,
+каждый процесс слушает канал и доставляет только своим игрокам (BOT_MODE=worker).
+Доставка идёт в фоне: publish не ждёт рассылки (её Telegram-лимиты не держат замок боя и транзакцию),
+а события одного боя (battle_id) доставляются строго по порядку — round_resolved N+1 не обгонит N.
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+MATCH_FOUND = "match_found"
+ROUND_RESOLVED = "round_resolved"
+BATTLE_FINISHED = "battle_finished"
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+
+def _owns_all(telegram_id: int) -> bool:
+    return True
+
+
+class EventBus(ABC):
+    """Подписки и доставка; publish реализуют наследники. Ошибка подписчика не ломает публикацию."""
+
+    def __init__(self, owns: Callable[[int], bool] = _owns_all):
+        self.owns = owns
+        self._handlers: dict[str, list[EventHandler]] = {}
+        self._queues: dict[Optional[int], deque[tuple[str, dict]]] = {}  # очередь доставки на бой
+        self._pending: set[asyncio.Task] = set()
+        self.published = 0
+        self.delivered = 0
+        self.failures = 0
+
+    def subscribe(self, event: str, handler: EventHandler) -> None:
+        self._handlers.setdefault(event, []).append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        """Дождаться доставки уже принятых событий."""
+        while self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    @abstractmethod
+    async def publish(self, event: str, payload: dict) -> None:
+        ...
+
+    def _enqueue(self, event: str, payload: dict) -> None:
+        """Поставить событие в очередь его боя; у очереди один разборщик, пока она не опустеет."""
+        key = payload.get("battle_id")
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            task = asyncio.create_task(self._drain(key, queue))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        queue.append((event, payload))
+
+    async def _drain(self, key: Optional[int], queue: deque) -> None:
+        try:
+            while queue:
+                event, payload = queue.popleft()
+                await self._dispatch(event, payload)
+        finally:
+            if self._queues.get(key) is queue:
+                del self._queues[key]
+
+    async def _dispatch(self, event: str, payload: dict) -> None:
+        if not any(self.owns(tg) for tg in payload.get("recipients", ()) if tg):
+            return
+        for handler in self._handlers.get(event, ()):
+            try:
+                await handler(payload)
+                self.delivered += 1
+            except Exception:
+                self.failures += 1
+                logger.exception("Event %s handler failed (%s)", event, payload.get("battle_id"))
+
+    def stats(self) -> dict:
+        return {"published": self.published, "delivered": self.delivered, "failures": self.failures}
+
+
+class LocalEventBus(EventBus):
+    """Подписчики этого процесса; publish только ставит событие в очередь боя."""
+
+    async def publish(self, event: str, payload: dict) -> None:
+        self.published += 1
+        self._enqueue(event, payload)
+
+
+class PgEventBus(EventBus):
+    """
+    NOTIFY <channel>, '{"event": ..., "payload": ...}' (до 8000 байт); слушатель держит отдельное соединение из пула.
+    Если оно обрывается, watchdog переподключает LISTEN (события за время обрыва теряются — как и сообщение
+    при падении процесса посреди рассылки).
+    """
+
+    def __init__(
+        self, database, channel: str = "battle_events", owns: Callable[[int], bool] = _owns_all,
+        check_interval: float = 10.0,
+    ):
+        super().__init__(owns)
+        self.db = database
+        self.channel = channel
+        self.check_interval = check_interval
+        self._conn = None
+        self._watchdog: Optional[asyncio.Task] = None
+
+    async def publish(self, event: str, payload: dict) -> None:
+        self.published += 1
+        message = json.dumps({"event": event, "payload": payload}, ensure_ascii=False)
+        try:
+            async with self.db.pool.acquire() as conn:
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, message)
+        except Exception:
+            self.failures += 1
+            logger.exception("Event %s publish failed", event)
+
+    def _on_notify(self, conn, pid: int, channel: str, message: str) -> None:
+        try:
+            data = json.loads(message)
+        except ValueError:
+            logger.warning("Bad event payload on %s: %r", channel, message[:200])
+            return
+        self._enqueue(data["event"], data["payload"])
+
+    async def _listen(self) -> None:
+        conn = await self.db.pool.acquire()
+        try:
+            await conn.add_listener(self.channel, self._on_notify)
+        except Exception:
+            await self.db.pool.release(conn)
+            raise
+        self._conn = conn
+        logger.info("Listening for events on %s", self.channel)
+
+    async def _release(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            await conn.remove_listener(self.channel, self._on_notify)
+        except Exception:
+            pass
+        try:
+            await self.db.pool.release(conn)
+        except Exception:
+            pass
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if self._conn is not None:
+                    await self._conn.fetchval("SELECT 1")
+                    continue
+            except Exception:
+                logger.warning("Event listener connection lost, reconnecting")
+                await self._release()
+            try:
+                await self._listen()
+            except Exception:
+                logger.exception("Event listener reconnect failed")
+
+    async def start(self) -> None:
+        await self._listen()
+        self._watchdog = asyncio.create_task(self._watch(), name="events:watchdog")
+
+    async def stop(self) -> None:
+        if self._watchdog:
+            self._watchdog.cancel()
+            try:
+                await self._watchdog
+            except asyncio.CancelledError:
+                pass
+            self._watchdog = None
+        await self._release()
+        await super().stop()
@@ -0,0 +1,61 @@
+"""
+Реестр активных боёв в памяти: player_id -> id незавершённого боя арены / боя с тенью.
+Заполняется при старте процесса из БД (Database.load_fight_registry) и обновляется в Database
+там, где бой создаётся и завершается, поэтому «в бою ли игрок» отвечается за O(1) без запроса.
+Реестр знает только о боях своего процесса: при нескольких процессах его выключают
+(FIGHT_REGISTRY_ENABLED=0) — тогда Database ищет бои запросами, как раньше.
+"""
+from typing import Iterable, Optional
+
+
+class FightRegistry:
+    def __init__(self):
+        self._arena: dict[int, int] = {}  # player_id -> battle_id
+        self._shadow: dict[int, int] = {}  # player_id -> shadow_fight_id
+        self.loaded = False
+
+    def load(self, battles: Iterable[tuple[int, int, int]], shadow_fights: Iterable[tuple[int, int]]) -> None:
+        """
+        Перестроить из (battle_id, player1_id, player2_id) и (fight_id, player_id) незавершённых боёв.
+        Строки по возрастанию id: при нескольких боях у игрока остаётся последний (как ORDER BY id DESC LIMIT 1).
+        """
+        arena: dict[int, int] = {}
+        for battle_id, p1, p2 in battles:
+            arena[p1] = battle_id
+            arena[p2] = battle_id
+        self._arena = arena
+        self._shadow = {player_id: fight_id for fight_id, player_id in shadow_fights}
+        self.loaded = True
+
+    def battle_of(self, player_id: int) -> Optional[int]:
+        return self._arena.get(player_id)
+
+    def shadow_of(self, player_id: int) -> Optional[int]:
+        return self._shadow.get(player_id)
+
+    def in_fight(self, player_id: int) -> bool:
+        return player_id in self._arena or player_id in self._shadow
+
+    def arena_started(self, battle_id: int, *player_ids: int) -> None:
+        for pid in player_ids:
+            self._arena[pid] = battle_id
+
+    def arena_finished(self, battle_id: int, *player_ids: int) -> None:
+        """Снять бой у игроков; запись другого (более нового) боя не трогается."""
+        for pid in player_ids:
+            if self._arena.get(pid) == battle_id:
+                del self._arena[pid]
+
+    def shadow_started(self, fight_id: int, player_id: int) -> None:
+        self._shadow[player_id] = fight_id
+
+    def shadow_finished(self, fight_id: int, player_id: int) -> None:
+        if self._shadow.get(player_id) == fight_id:
+            del self._shadow[player_id]
+
+    def stats(self) -> dict:
+        return {
+            "arena_players": len(self._arena),
+            "shadow_players": len(self._shadow),
+            "loaded": self.loaded,
+        }
@@ -6,6 +6,7 @@ Crit 1.5x + игнор 50% брони; Dodge +0.5% за AGI; Crit Chance +0.5% 
 """
 import random
 import math
+import datetime
 from typing import TypedDict
 
 from services import battle_phrases
@@ -34,6 +35,65 @@ class BattleMath:
         """MaxHP = 30 + (level * 5) + (stamina * 5)."""
         return 30 + (level * 5) + (stamina * 5)
 
+    @staticmethod
+    def class_stats(
+        player_class: str | None,
+        level: int,
+        strength: int,
+        agility: int,
+        stamina: int,
+        armor: int,
+        has_full_armor: bool,
+        weapon_min: int,
+        weapon_max: int,
+        weapon_class_type: str | None,
+    ) -> dict:
+        """
+        MaxHP и классовые бонусы от экипировки (strength уже с bonus_str).
+        Танк: +15 HP за выносливость и +stamina к броне в полном сете; Ловкач: крит и урон от AGI
+        с оружием rogue; Мастер: урон и блок от STR с оружием warrior.
+        """
+        if player_class == "tank":
+            max_hp = 30 + (level * 5) + (stamina * 15)
+        else:
+            max_hp = BattleMath.max_hp(level, stamina)
+        crit_bonus = 0.0
+        block_bonus = 0.0
+        if player_class == "rogue" and weapon_class_type == "rogue":
+            crit_bonus = agility * 2.0
+            weapon_min = weapon_min + agility
+            weapon_max = weapon_max + agility
+        elif player_class == "tank" and has_full_armor:
+            armor = armor + stamina
+        elif player_class == "warrior" and weapon_class_type == "warrior":
+            weapon_min = weapon_min + strength * 2
+            weapon_max = weapon_max + strength * 2
+            block_bonus = float(strength)
+        return {
+            "max_hp": max_hp,
+            "armor": armor,
+            "weapon_min": weapon_min,
+            "weapon_max": weapon_max if weapon_max else weapon_min,
+            "crit_bonus": crit_bonus,
+            "block_bonus": block_bonus,
+        }
+
+    @staticmethod
+    def regen_hp(current_hp: int | None, hp_updated_at: datetime.datetime | None, max_hp: int, now: datetime.datetime) -> int:
+        """
+        HP вне боя: +1 HP за каждую полную минуту с hp_updated_at, не выше MaxHP.
+        Чистая функция — считается при чтении; в БД пишется только изменение HP боем или зельем.
+        current_hp = None — игрок полностью здоров.
+        """
+        if current_hp is None:
+            return max_hp
+        if hp_updated_at is None:
+            return min(max_hp, current_hp)
+        if hp_updated_at.tzinfo is None:
+            hp_updated_at = hp_updated_at.replace(tzinfo=datetime.timezone.utc)
+        mins = max(0, int((now - hp_updated_at).total_seconds() // 60))
+        return min(max_hp, current_hp + mins)
+
     @staticmethod
     def xp_for_next_level(current_level: int) -> int:
         """Опыт для след. уровня = (Current_Level ** 2) * 100."""
@@ -52,9 +112,9 @@ class BattleMath:
         return armor / (armor + 50)
 
     @staticmethod
-    def base_damage(weapon_min: int, weapon_max: int, strength: int) -> float:
+    def base_damage(weapon_min: int, weapon_max: int, strength: int, rng=random) -> float:
         """Base_Dmg = Weapon_Dmg + (Strength * 0.5). Weapon_Dmg = random(min, max)."""
-        w_dmg = random.randint(weapon_min, weapon_max) if weapon_max >= weapon_min else weapon_min
+        w_dmg = rng.randint(weapon_min, weapon_max) if weapon_max >= weapon_min else weapon_min
         return w_dmg + (strength * 0.5)
 
     @staticmethod
@@ -99,9 +159,11 @@ class BattleMath:
         p2_block_zone: int,
         name1: str = "Игрок 1",
         name2: str = "Игрок 2",
+        rng=random,
     ) -> tuple[int, int, list[str]]:
         """
         Один раунд PvP. attack_zone==0 = хил (не атакует). Возвращает (new_p1_hp, new_p2_hp, log).
+        rng — поток раунда (services/rng.py): с тем же потоком раунд и его лог повторяются бит-в-бит.
         """
         log: list[str] = []
         dmg1_to_2 = 0
@@ -113,25 +175,25 @@ class BattleMath:
         else:
             blocked1 = BattleMath.zone_blocked(p1_attack_zone, p2_block_zone)
             block_bonus2 = p2_stats.get("block_bonus", 0) or 0
-            if not blocked1 and block_bonus2 > 0 and random.random() * 100 < block_bonus2:
+            if not blocked1 and block_bonus2 > 0 and rng.random() * 100 < block_bonus2:
                 blocked1 = True
             base1 = BattleMath.base_damage(
-                p1_stats["weapon_min"], p1_stats["weapon_max"], p1_stats["strength"]
+                p1_stats["weapon_min"], p1_stats["weapon_max"], p1_stats["strength"], rng
             )
             crit_chance1 = BattleMath.crit_chance(p1_stats["intuition"]) + p1_stats.get("crit_bonus", 0)
-            crit1 = random.random() * 100 < crit_chance1
+            crit1 = rng.random() * 100 < crit_chance1
             if blocked1 and not crit1:
-                log.append(battle_phrases.build_exchange_line(name1, name2, "block"))
+                log.append(battle_phrases.build_exchange_line(name1, name2, "block", rng=rng))
             else:
-                dodge = random.random() * 100 < BattleMath.dodge_chance(p2_stats["agility"])
+                dodge = rng.random() * 100 < BattleMath.dodge_chance(p2_stats["agility"])
                 if dodge:
-                    log.append(battle_phrases.build_exchange_line(name1, name2, "dodge"))
+                    log.append(battle_phrases.build_exchange_line(name1, name2, "dodge", rng=rng))
                 else:
                     dmg1_to_2 = BattleMath.final_damage(
                         base1, p2_stats.get("armor", 0), is_crit=crit1
                     )
                     log.append(battle_phrases.build_exchange_line(
-                        name1, name2, "crit" if crit1 else "hit", dmg1_to_2
+                        name1, name2, "crit" if crit1 else "hit", dmg1_to_2, rng=rng
                     ))
 
         # P2 бьёт P1
@@ -140,25 +202,25 @@ class BattleMath:
         else:
             blocked2 = BattleMath.zone_blocked(p2_attack_zone, p1_block_zone)
             block_bonus1 = p1_stats.get("block_bonus", 0) or 0
-            if not blocked2 and block_bonus1 > 0 and random.random() * 100 < block_bonus1:
+            if not blocked2 and block_bonus1 > 0 and rng.random() * 100 < block_bonus1:
                 blocked2 = True
             base2 = BattleMath.base_damage(
-                p2_stats["weapon_min"], p2_stats["weapon_max"], p2_stats["strength"]
+                p2_stats["weapon_min"], p2_stats["weapon_max"], p2_stats["strength"], rng
             )
             crit_chance2 = BattleMath.crit_chance(p2_stats["intuition"]) + p2_stats.get("crit_bonus", 0)
-            crit2 = random.random() * 100 < crit_chance2
+            crit2 = rng.random() * 100 < crit_chance2
             if blocked2 and not crit2:
-                log.append(battle_phrases.build_exchange_line(name2, name1, "block"))
+                log.append(battle_phrases.build_exchange_line(name2, name1, "block", rng=rng))
             else:
-                dodge = random.random() * 100 < BattleMath.dodge_chance(p1_stats["agility"])
+                dodge = rng.random() * 100 < BattleMath.dodge_chance(p1_stats["agility"])
                 if dodge:
-                    log.append(battle_phrases.build_exchange_line(name2, name1, "dodge"))
+                    log.append(battle_phrases.build_exchange_line(name2, name1, "dodge", rng=rng))
                 else:
                     dmg2_to_1 = BattleMath.final_damage(
                         base2, p1_stats.get("armor", 0), is_crit=crit2
                     )
                     log.append(battle_phrases.build_exchange_line(
-                        name2, name1, "crit" if crit2 else "hit", dmg2_to_1
+                        name2, name1, "crit" if crit2 else "hit", dmg2_to_1, rng=rng
                     ))
 
         new_p1_hp = max(0, p1_stats["hp"] - dmg2_to_1)
@@ -0,0 +1,96 @@
+"""
+Снимки досок рейтинга в памяти: страницы ТОП-100 отдаются без запроса в БД.
+Доски — Database._BOARD_KEYS: уровень/опыт, по классам, богачи (credits), победы на арене.
+ТОП доски «уровень» (/top) отдаёт индекс рейтинга в памяти (services/rank_index.py).
+Снимок (первые SNAPSHOT_DEPTH строк) обновляется фоновой задачей (main.py, LEADERBOARD_REFRESH),
+причём только у досок, которые открывали с прошлого обновления. Глубже снимка — keyset-пагинация
+через Database.get_board_rows(after=ключ последней строки).
+"""
+from typing import NamedTuple, Optional
+
+from database.db import db
+
+SNAPSHOT_DEPTH = 100
+PAGE_SIZE = 25
+
+BOARD_TITLES = {
+    "level": "🏆 Уровень",
+    "rogue": "🗡 Ловкачи",
+    "tank": "🛡 Танки",
+    "warrior": "⚔️ Мастера",
+    "rich": "💰 Богачи",
+    "wins": "🥊 Победы",
+}
+
+
+class Page(NamedTuple):
+    rows: list[dict]
+    page: int
+    start: int  # место первой строки (1-based)
+    has_next: bool
+    next_cursor: Optional[tuple]  # для страницы за пределами снимка
+    from_snapshot: bool
+
+
+class LeaderboardService:
+    def __init__(self, database, depth: int = SNAPSHOT_DEPTH, page_size: int = PAGE_SIZE):
+        self.db = database
+        self.depth = depth
+        self.page_size = page_size
+        self._snapshots: dict[str, list[dict]] = {}
+        self._viewed: set[str] = set()
+        self.refreshes = 0
+
+    async def _snapshot(self, board: str) -> list[dict]:
+        self._viewed.add(board)
+        rows = self._snapshots.get(board)
+        if rows is None:
+            rows = await self.db.get_board_rows(board, self.depth)
+            self._snapshots[board] = rows
+        return rows
+
+    async def top(self, board: str, limit: int) -> list[dict]:
+        """
+        Первые limit строк доски (limit <= depth). Доска «уровень» — из rank_index (Database.get_leaderboard):
+        свежая, без ожидания обновления снимка; остальные — из снимка.
+        """
+        if board == "level":
+            return await self.db.get_leaderboard(limit)
+        rows = await self._snapshot(board)
+        return rows[:limit]
+
+    async def page(self, board: str, page: int, cursor: Optional[tuple] = None) -> Page:
+        """
+        Страница page (с 1). Страницы внутри снимка — из памяти; дальше нужен cursor
+        (next_cursor предыдущей страницы), иначе отдаётся последняя страница снимка.
+        """
+        rows = await self._snapshot(board)
+        snapshot_pages = max(1, (len(rows) + self.page_size - 1) // self.page_size)
+        start = (page - 1) * self.page_size
+        if cursor is None or start < len(rows):
+            page = max(1, min(page, snapshot_pages))
+            start = (page - 1) * self.page_size
+            chunk = rows[start:start + self.page_size]
+            last_of_snapshot = start + self.page_size >= len(rows)
+            # Полный снимок — за ним могут быть ещё игроки
+            more = len(rows) >= self.depth
+            has_next = not last_of_snapshot or more
+            next_cursor = chunk[-1]["key"] if last_of_snapshot and more and chunk else None
+            return Page(chunk, page, start + 1, has_next, next_cursor, True)
+        fetched = await self.db.get_board_rows(board, self.page_size + 1, after=cursor)
+        chunk = fetched[:self.page_size]
+        has_next = len(fetched) > self.page_size
+        return Page(chunk, page, start + 1, has_next, chunk[-1]["key"] if has_next else None, False)
+
+    async def refresh(self) -> None:
+        """Перечитать снимки досок, которые открывали с прошлого обновления; остальные выбросить."""
+        boards, self._viewed = self._viewed, set()
+        for board in list(self._snapshots):
+            if board not in boards:
+                del self._snapshots[board]
+        for board in boards:
+            self._snapshots[board] = await self.db.get_board_rows(board, self.depth)
+            self.refreshes += 1
+
+
+leaderboard = LeaderboardService(db)
@@ -0,0 +1,166 @@
+"""
+Matchmaking арены в памяти (включается MATCHMAKER_ENABLED=1).
+Ожидающие игроки лежат в корзинах по (ставка, уровень); новый игрок за O(1) сводится
+с самым давним ожидающим из корзин уровня-1, уровня и уровня+1. В БД пишется только итог:
+Database.arena_match_queued удаляет обоих из arena_queue и создаёт бой, «БОЙ НАЧАЛСЯ» рассылает
+подписчик события match_found (services/events.py); on_match(battle_id) — необязательный доп. хук.
+Таблица arena_queue остаётся источником правды (ставка, отмена, рестарт).
+fair=True: из самых давних ожидающих соседних корзин берётся тот, с кем шанс победы ближе к 50%
+(точный расчёт services/win_solver.py по текущим статам; без numpy — как обычно, свой уровень первым).
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from services.win_solver import win_solver
+
+logger = logging.getLogger(__name__)
+
+LEVEL_SPREAD = 1
+
+
+class Matchmaker:
+    """Очередь заявок + один воркер: сведение пар идёт последовательно, без блокировок в памяти."""
+
+    def __init__(
+        self, database, on_match: Optional[Callable[[int], Awaitable[None]]] = None, fair: bool = False,
+    ):
+        self.db = database
+        self.on_match = on_match
+        self.fair = fair
+        # (stake, level) -> player_id в порядке входа
+        self._buckets: dict[tuple[int, int], OrderedDict[int, None]] = {}
+        self._where: dict[int, tuple[int, int]] = {}
+        self._inbox: asyncio.Queue[tuple[str, int, int, int]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.matches = 0
+
+    async def start(self) -> None:
+        """Поднять корзины из arena_queue (после рестарта) и запустить воркер."""
+        for row in await self.db.get_arena_queue():
+            self._add(row["player_id"], row["level"], row["stake"])
+        self._task = asyncio.create_task(self._run(), name="matchmaker")
+        logger.info("Matchmaker started, %s players waiting", len(self._where))
+        # Сведение тех, кто ждал друг друга до рестарта
+        for pid, (stake, level) in list(self._where.items()):
+            self._inbox.put_nowait(("rematch", pid, level, stake))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def submit(self, player_id: int, level: int, stake: int) -> None:
+        """Игрок уже в arena_queue со списанной ставкой — найти ему пару."""
+        self._inbox.put_nowait(("join", player_id, level, stake))
+
+    def remove(self, player_id: int) -> None:
+        """Игрок отменил поиск."""
+        self._inbox.put_nowait(("leave", player_id, 0, 0))
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def _add(self, player_id: int, level: int, stake: int) -> None:
+        self._discard(player_id)
+        key = (stake, level)
+        self._buckets.setdefault(key, OrderedDict())[player_id] = None
+        self._where[player_id] = key
+
+    def _discard(self, player_id: int) -> None:
+        key = self._where.pop(player_id, None)
+        if key is None:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(player_id, None)
+            if not bucket:
+                del self._buckets[key]
+
+    def _candidates(self, player_id: int, level: int, stake: int) -> list[tuple[int, int]]:
+        """(расстояние по уровню, player_id) самого давнего ожидающего каждой соседней корзины (≤ 2*LEVEL_SPREAD+1)."""
+        out = []
+        for lvl in range(level - LEVEL_SPREAD, level + LEVEL_SPREAD + 1):
+            bucket = self._buckets.get((stake, lvl))
+            if not bucket:
+                continue
+            # Корзины упорядочены по входу
+            for pid in bucket:
+                if pid != player_id:
+                    out.append((abs(lvl - level), pid))
+                    break
+        return out
+
+    def _pick(self, player_id: int, level: int, stake: int) -> Optional[int]:
+        """Самый давний ожидающий из соседних корзин; между корзинами предпочитаем свой уровень."""
+        candidates = self._candidates(player_id, level, stake)
+        return min(candidates, key=lambda c: c[0])[1] if candidates else None
+
+    async def _pick_fair(self, player_id: int, level: int, stake: int) -> Optional[int]:
+        """Из кандидатов _candidates — с шансом победы ближе к 50%, при равенстве — ближе по уровню."""
+        candidates = self._candidates(player_id, level, stake)
+        if len(candidates) < 2 or not win_solver.available:
+            return min(candidates, key=lambda c: c[0])[1] if candidates else None
+        stats = await self.db.get_combat_stats_many([player_id, *(pid for _, pid in candidates)], for_arena=True)
+        mine = stats.get(player_id)
+        if not mine:
+            return min(candidates, key=lambda c: c[0])[1]
+        best, best_score = None, None
+        for rank, pid in candidates:
+            other = stats.get(pid)
+            if not other:
+                continue
+            p_win, _ = await win_solver.win_chance(mine, other, mine.get("hp"), other.get("hp"))
+            score = (abs(p_win - 0.5), rank)
+            if best_score is None or score < best_score:
+                best, best_score = pid, score
+        return best if best is not None else min(candidates, key=lambda c: c[0])[1]
+
+    async def _run(self) -> None:
+        while True:
+            kind, player_id, level, stake = await self._inbox.get()
+            try:
+                if kind == "leave":
+                    self._discard(player_id)
+                elif kind == "rematch" and player_id not in self._where:
+                    continue  # уже сведён раньше в этом же проходе
+                else:
+                    await self._try_match(player_id, level, stake)
+            except Exception:
+                logger.exception("Matchmaker failed on %s %s", kind, player_id)
+
+    async def _try_match(self, player_id: int, level: int, stake: int) -> None:
+        while True:
+            if self.fair:
+                other_id = await self._pick_fair(player_id, level, stake)
+            else:
+                other_id = self._pick(player_id, level, stake)
+            if other_id is None:
+                self._add(player_id, level, stake)
+                return
+            other_key = self._where[other_id]
+            self._discard(other_id)
+            self._discard(player_id)
+            battle_id, still_queued = await self.db.arena_match_queued(other_id, player_id)
+            if battle_id is not None:
+                self.matches += 1
+                if self.on_match is not None:
+                    try:
+                        await self.on_match(battle_id)
+                    except Exception:
+                        logger.exception("Matchmaker on_match failed for battle %s", battle_id)
+                return
+            # Кого-то уже нет в arena_queue (отмена, таймаут, другой воркер): оставшегося возвращаем
+            if other_id in still_queued:
+                self._add(other_id, other_key[1], other_key[0])
+            if player_id not in still_queued:
+                return
+            if other_id in still_queued:
+                # Пара «живая», но строка занята параллельной транзакцией — ждём следующего входа
+                self._add(player_id, level, stake)
+                return
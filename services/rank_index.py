@@ -0,0 +1,169 @@
+"""
+Индекс рейтинга в памяти: место игрока и ТОП-N за O(log n) вместо COUNT(*) / ORDER BY по player_stats.
+Порядок как у доски «уровень»: level DESC, experience DESC, player_id DESC.
+Деревья Фенвика в два яруса: по уровням (сколько игроков на уровне) и в каждом уровне — по опыту
+(сколько игроков уровня с таким опытом); рядом — сами игроки каждого (уровень, опыт).
+Опыт внутри уровня не превышает порога перехода на следующий, поэтому дерево уровня — плотный массив
+не длиннее этого порога; вставка и удаление — O(log), без сдвига списков.
+Место = 1 + игроков на уровнях выше + игроков своего уровня с большим опытом.
+ТОП-N — спуск по деревьям к месту offset+1 и дальше вниз по группам (уровень, опыт), каждая — за O(log).
+"""
+from typing import Iterable, Optional
+
+
+class _Fenwick:
+    """Счётчики по позициям 1..size: add и prefix за O(log size); size — степень двойки, растёт удвоением."""
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, size: int = 1):
+        self.size = 1 << max(0, size - 1).bit_length()
+        self.tree = [0] * (self.size + 1)
+
+    @classmethod
+    def from_counts(cls, counts: dict[int, int]) -> "_Fenwick":
+        """Линейная сборка из {позиция: счётчик}."""
+        fenwick = cls(max(counts, default=1))
+        tree, size = fenwick.tree, fenwick.size
+        for pos, count in counts.items():
+            tree[pos] += count
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        return fenwick
+
+    @property
+    def total(self) -> int:
+        return self.tree[self.size]
+
+    def add(self, pos: int, delta: int) -> None:
+        if pos > self.size:
+            self._grow(pos)
+        while pos <= self.size:
+            self.tree[pos] += delta
+            pos += pos & -pos
+
+    def find_kth(self, k: int) -> int:
+        """Наименьшая позиция, у которой prefix(pos) >= k (1 <= k <= total)."""
+        pos = 0
+        step = self.size
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos + 1
+
+    def prefix(self, pos: int) -> int:
+        """Сумма по позициям <= pos."""
+        pos = min(pos, self.size)
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def _grow(self, pos: int) -> None:
+        # Новые позиции пусты: узлы между size и 2*size покрывают только их, узел 2*size — всю сумму
+        while self.size < pos:
+            total = self.total
+            self.tree.extend([0] * self.size)
+            self.size *= 2
+            self.tree[self.size] = total
+
+
+class RankIndex:
+    def __init__(self, max_level: int = 64):
+        self._levels = _Fenwick(max_level)
+        # level -> дерево по опыту (позиция experience + 1)
+        self._experience: dict[int, _Fenwick] = {}
+        # level -> experience -> player_id с таким счётом
+        self._players: dict[int, dict[int, set[int]]] = {}
+        self._scores: dict[int, tuple[int, int]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple[int, int, int]]) -> "RankIndex":
+        """Построить из (player_id, level, experience) за O(n)."""
+        index = cls()
+        level_counts: dict[int, int] = {}
+        exp_counts: dict[int, dict[int, int]] = {}
+        for player_id, level, experience in rows:
+            level, experience = max(1, level), max(0, experience)
+            index._scores[player_id] = (level, experience)
+            level_counts[level] = level_counts.get(level, 0) + 1
+            counts = exp_counts.setdefault(level, {})
+            counts[experience + 1] = counts.get(experience + 1, 0) + 1
+            index._players.setdefault(level, {}).setdefault(experience, set()).add(player_id)
+        if level_counts:
+            index._levels = _Fenwick.from_counts(level_counts)
+        index._experience = {level: _Fenwick.from_counts(counts) for level, counts in exp_counts.items()}
+        return index
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._scores
+
+    def update(self, player_id: int, level: int, experience: int) -> None:
+        """Новый (или первый) счёт игрока."""
+        level, experience = max(1, level), max(0, experience)
+        old = self._scores.get(player_id)
+        if old == (level, experience):
+            return
+        if old is not None:
+            self._remove(player_id, *old)
+        tree = self._experience.get(level)
+        if tree is None:
+            tree = self._experience[level] = _Fenwick(experience + 1)
+        tree.add(experience + 1, 1)
+        self._players.setdefault(level, {}).setdefault(experience, set()).add(player_id)
+        self._levels.add(level, 1)
+        self._scores[player_id] = (level, experience)
+
+    def discard(self, player_id: int) -> None:
+        old = self._scores.pop(player_id, None)
+        if old is not None:
+            self._remove(player_id, *old)
+
+    def rank(self, player_id: int) -> Optional[int]:
+        """Место игрока (#1 — лучший); None если игрока нет в индексе."""
+        score = self._scores.get(player_id)
+        if score is None:
+            return None
+        level, experience = score
+        above = len(self._scores) - self._levels.prefix(level)
+        tree = self._experience[level]
+        better_same_level = tree.total - tree.prefix(experience + 1)
+        return above + better_same_level + 1
+
+    def top(self, limit: int, offset: int = 0) -> list[int]:
+        """player_id мест offset+1 .. offset+limit, O((log L + log E) на группу с одинаковым счётом)."""
+        out: list[int] = []
+        # Место offset+1 сверху = k-й снизу; k — сколько игроков на этом месте и ниже
+        k = len(self._scores) - offset
+        while k > 0 and len(out) < limit:
+            level = self._levels.find_kth(k)
+            below_level = self._levels.prefix(level - 1)
+            tree = self._experience[level]
+            pos = tree.find_kth(k - below_level)
+            below = below_level + tree.prefix(pos - 1)
+            # Игроки группы по возрастанию player_id; k - below из них не выше места offset+1
+            group = sorted(self._players[level][pos - 1])[:k - below]
+            out.extend(reversed(group[-(limit - len(out)):]))
+            k = below
+        return out
+
+    def _remove(self, player_id: int, level: int, experience: int) -> None:
+        tree = self._experience[level]
+        tree.add(experience + 1, -1)
+        players = self._players[level]
+        players[experience].discard(player_id)
+        if not players[experience]:
+            del players[experience]
+        if not tree.total:
+            del self._experience[level]
+            del self._players[level]
+        self._levels.add(level, -1)
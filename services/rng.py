@@ -0,0 +1,78 @@
+"""
+Случайность боёв: поток (random/randint/choice) передаётся в BattleMath.resolve_round, battle_phrases,
+награды Тени и «Автобой» вместо глобального модуля random. Поток раунда выводится из rng_seed боя
+(battles.rng_seed / shadow_fights.rng_seed, у старых боёв — id) и номера раунда: состояние генератора
+нигде не хранится, а любой раунд воспроизводится бит-в-бит — в другом процессе, после рестарта, в бенчмарке.
+
+COMBAT_RNG=python (по умолчанию) — random.Random (Mersenne Twister на C);
+COMBAT_RNG=numpy — числа заранее тянутся блоками из numpy.random.Generator (Philox), вызов — элемент списка.
+Раунд тратит ~12 чисел; random.Random на C и так быстр, так что numpy-бэкенд — для единого семейства
+генераторов с services/simulator.py, а не ради скорости.
+Последовательности у бэкендов разные: для воспроизведения нужен тот же COMBAT_RNG, что и в бою.
+"""
+import itertools
+import os
+import random
+import zlib
+from typing import Optional, Protocol, Sequence, TypeVar
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - блочный бэкенд необязателен
+    np = None
+
+T = TypeVar("T")
+
+COMBAT_RNG = os.getenv("COMBAT_RNG", "python").lower()
+if COMBAT_RNG == "numpy" and np is None:
+    raise RuntimeError("COMBAT_RNG=numpy needs numpy: pip install numpy")
+
+
+class Rng(Protocol):
+    """То, что нужно боевым формулам; модуль random подходит как есть (поток по умолчанию)."""
+
+    def random(self) -> float: ...
+
+    def randint(self, a: int, b: int) -> int: ...
+
+    def choice(self, seq: Sequence[T]) -> T: ...
+
+
+class CombatRng(random.Random):
+    """random.Random с детерминированным сидом из (сид боя, раунд, поток)."""
+
+
+class BlockRng:
+    """
+    Равномерные [0, 1) из numpy блоками по block штук: random() — следующий элемент готового списка
+    (вызов на C, без обращения к генератору); randint и choice — через random().
+    """
+
+    def __init__(self, generator: "np.random.Generator", block: int = 16):
+        blocks = iter(lambda: generator.random(block).tolist(), None)
+        self.random = itertools.chain.from_iterable(blocks).__next__
+
+    def randint(self, a: int, b: int) -> int:
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[int(self.random() * len(seq))]
+
+
+def fight_seed(fight: dict) -> int:
+    """Сид боя из строки battles / shadow_fights; у боёв до миграции rng_seed пустой — берётся id."""
+    return fight.get("rng_seed") or fight["id"]
+
+
+def combat_rng(seed: int, round_number: int = 0, stream: str = "", backend: Optional[str] = None) -> Rng:
+    """
+    Поток раунда round_number боя с сидом seed. stream разделяет независимые потоки одного раунда
+    (например, "auto:<player_id>" для «Автобоя»), чтобы они не сдвигали числа расчёта раунда.
+    """
+    if (backend or COMBAT_RNG) == "numpy":
+        # Philox — счётчиковый генератор: ключ — сид боя, старшие слова счётчика — (раунд, поток),
+        # младшие растут при выдаче блоков — потоки разных раундов не пересекаются
+        counter = [0, 0, round_number, zlib.crc32(stream.encode())]
+        return BlockRng(np.random.Generator(np.random.Philox(key=seed, counter=counter)))
+    return CombatRng(f"{seed}:{round_number}:{stream}")
+
@@ -0,0 +1,187 @@
+"""
+Горизонтальное масштабирование: один вход для вебхука (BOT_MODE=router) и N воркеров (BOT_MODE=worker).
+Роутер проверяет секрет Telegram и пересылает апдейт воркеру по консистентному хэшу telegram_id,
+поэтому апдейты одного игрока обрабатываются одним процессом по порядку, а добавление воркера
+переносит лишь ~1/N игроков. Нажатия, которые двигают бой арены (ход, хил, сдача), идут владельцу
+боя — воркеру по хэшу battle_id, так что раунд одного боя никогда не считается в двух процессах;
+внутри воркера раунд дополнительно сериализуется BattleLocks.
+Общее состояние воркеров — только БД: выбор зон (move_atk_/move_def_) приходит воркеру игрока, а подтверждение
+хода — владельцу боя, поэтому воркер не стартует (main.check_worker_settings) без STATE_STORE=postgres,
+FIGHT_REGISTRY_ENABLED=0, MATCHMAKER_ENABLED=0, COMBAT_STATS_CACHE_SIZE=0 и PLAYER_CTX_TTL=0.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import weakref
+from bisect import bisect_right
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from services.events import BATTLE_FINISHED, EventBus
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# callback_data, после которых пересчитывается бой арены — маршрутизируются владельцу боя
+BATTLE_CALLBACKS = ("move_confirm", "move_auto", "move_heal", "surrender_confirm")
+# Типы апдейтов, у которых отправитель лежит в "from" (или "user")
+_USER_UPDATE_TYPES = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request",
+    "poll_answer", "message_reaction",
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Консистентный хэш с виртуальными узлами: owner(key) -> один из workers."""
+
+    def __init__(self, workers: list[str], vnodes: int = 160):
+        if not workers:
+            raise ValueError("HashRing needs at least one worker")
+        self.workers = list(workers)
+        points = sorted((_hash(f"{w}#{i}"), w) for w in self.workers for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [w for _, w in points]
+
+    def owner(self, key: str) -> str:
+        i = bisect_right(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+def update_sender(update: dict) -> tuple[Optional[int], Optional[str]]:
+    """(telegram_id отправителя, callback_data) из сырого апдейта; (None, None) — апдейт без пользователя."""
+    for kind in _USER_UPDATE_TYPES:
+        obj = update.get(kind)
+        if obj:
+            user = obj.get("from") or obj.get("user") or {}
+            return user.get("id"), obj.get("data") if kind == "callback_query" else None
+    return None, None
+
+
+class BattleLocks:
+    """asyncio.Lock на бой в пределах процесса; замки освобождаются, когда их никто не держит."""
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def get(self, battle_id: int) -> asyncio.Lock:
+        lock = self._locks.get(battle_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[battle_id] = lock
+        return lock
+
+
+battle_locks = BattleLocks()
+
+
+class UpdateRouter:
+    """
+    aiohttp-приложение роутера: POST path -> воркер-владелец (его ответ отдаётся Telegram как есть).
+    database нужен только для battle_id игрока при боевых нажатиях. Найденный бой кэшируется на battle_ttl
+    секунд и сбрасывается событием battle_finished (subscribe_events); «боя нет» не кэшируется —
+    иначе подтверждения только что начатого боя ушли бы не его владельцу.
+    """
+
+    def __init__(
+        self, database, workers: list[str], secret: str, worker_path: str = "/webhook",
+        timeout: float = 55.0, battle_ttl: float = 10.0,
+    ):
+        self.db = database
+        self.ring = HashRing(workers)
+        self.secret = secret
+        self.worker_path = worker_path
+        self.timeout = timeout
+        self.battle_ttl = battle_ttl
+        self._battles: dict[int, tuple[float, int]] = {}
+        self._session: Optional[ClientSession] = None
+        self.forwarded: dict[str, int] = {w: 0 for w in workers}
+        self.battle_routed = 0
+        self.failures = 0
+
+    async def _battle_of(self, telegram_id: int) -> Optional[int]:
+        now = time.monotonic()
+        cached = self._battles.get(telegram_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        battle_id = await self.db.get_active_battle_id_by_telegram(telegram_id)
+        if battle_id is None:
+            self._battles.pop(telegram_id, None)
+            return None
+        if len(self._battles) > 100_000:
+            self._battles.clear()
+        self._battles[telegram_id] = (now + self.battle_ttl, battle_id)
+        return battle_id
+
+    def subscribe_events(self, bus: EventBus) -> None:
+        bus.subscribe(BATTLE_FINISHED, self._on_battle_finished)
+
+    async def _on_battle_finished(self, payload: dict) -> None:
+        for telegram_id in payload.get("recipients", ()):
+            cached = self._battles.get(telegram_id)
+            if cached and cached[1] == payload.get("battle_id"):
+                del self._battles[telegram_id]
+
+    async def route(self, update: dict) -> str:
+        telegram_id, data = update_sender(update)
+        if telegram_id is None:
+            return self.ring.owner(f"update:{update.get('update_id', 0)}")
+        if data in BATTLE_CALLBACKS:
+            battle_id = await self._battle_of(telegram_id)
+            if battle_id is not None:
+                self.battle_routed += 1
+                return self.ring.owner(f"battle:{battle_id}")
+        return self.ring.owner(f"user:{telegram_id}")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        worker = await self.route(update)
+        try:
+            async with self._session.post(
+                worker + self.worker_path, data=body,
+                headers={SECRET_HEADER: self.secret, "Content-Type": "application/json"},
+            ) as resp:
+                payload = await resp.read()
+                self.forwarded[worker] += 1
+                return web.Response(status=resp.status, body=payload, content_type=resp.content_type)
+        except Exception:
+            # Не 2xx — Telegram повторит доставку позже
+            self.failures += 1
+            logger.exception("Forward of update %s to %s failed", update.get("update_id"), worker)
+            return web.Response(status=502)
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok",
+            "forwarded": self.forwarded,
+            "battle_routed": self.battle_routed,
+            "failures": self.failures,
+        })
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self._session = ClientSession(timeout=ClientTimeout(total=self.timeout))
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        if self._session:
+            await self._session.close()
+
+    def build_app(self, path: str) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        app.router.add_get("/healthz", self.healthz)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
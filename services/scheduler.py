@@ -0,0 +1,167 @@
+"""
+Фоновые периодические задачи (очистка зависших боёв и очереди и т.п.) вместо вызовов в хендлерах.
+Каждая задача — свой интервал с джиттером. При нескольких процессах задачи выполняет только лидер:
+тот, кто держит сессионный pg_try_advisory_lock на отдельном соединении из пула.
+Если соединение лидера обрывается, лок снимается сам и его подхватывает другой процесс.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock лидера планировщика (любой постоянный bigint)
+SCHEDULER_LOCK_KEY = 7_466_630_002
+
+
+class Job:
+    """Периодическая задача и её метрики (runs, failures, last/avg/max длительность в мс)."""
+
+    def __init__(
+        self, name: str, func: Callable[[], Awaitable[object]], interval: float, jitter: float = 0.1,
+        leader_only: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.runs = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.last_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def next_delay(self) -> float:
+        """Интервал ± jitter (доля интервала), чтобы процессы и задачи не били в БД одновременно."""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_ms": round(self.last_ms, 1),
+            "avg_ms": round(self.total_ms / self.runs, 1) if self.runs else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """Планировщик задач; database нужен только для лока лидера (Database.pool)."""
+
+    def __init__(self, database, lock_key: int = SCHEDULER_LOCK_KEY, leader_retry: float = 30.0):
+        self.db = database
+        self.lock_key = lock_key
+        self.leader_retry = leader_retry
+        self.jobs: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._leader_conn = None
+        self._leader_lock = asyncio.Lock()
+
+    def add(
+        self, name: str, func: Callable[[], Awaitable[object]], interval: float, jitter: float = 0.1,
+        leader_only: bool = True,
+    ) -> Job:
+        """leader_only=False — задача про локальное состояние процесса (кэши в памяти), выполняется везде."""
+        job = Job(name, func, interval, jitter, leader_only)
+        self.jobs[name] = job
+        return job
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_conn is not None
+
+    async def start(self) -> None:
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"job:{job.name}"))
+        logger.info("Scheduler started: %s", ", ".join(self.jobs) or "no jobs")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self._release_leader()
+
+    def stats(self) -> list[dict]:
+        return [job.stats() for job in self.jobs.values()]
+
+    async def _ensure_leader(self) -> bool:
+        """Проверить/захватить лидерство. Лок сессионный: живёт, пока живо соединение."""
+        async with self._leader_lock:
+            if self._leader_conn is not None:
+                try:
+                    await self._leader_conn.fetchval("SELECT 1")
+                    return True
+                except Exception:
+                    logger.warning("Scheduler lost leader connection")
+                    await self._release_leader()
+            conn = await self.db.pool.acquire()
+            try:
+                got = await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key)
+            except Exception:
+                await self.db.pool.release(conn)
+                raise
+            if not got:
+                await self.db.pool.release(conn)
+                return False
+            self._leader_conn = conn
+            logger.info("Scheduler: this process is the leader")
+            return True
+
+    async def _release_leader(self) -> None:
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is None:
+            return
+        try:
+            await conn.execute("SELECT pg_advisory_unlock($1)", self.lock_key)
+        except Exception:
+            pass
+        try:
+            await self.db.pool.release(conn)
+        except Exception:
+            pass
+
+    async def _loop(self, job: Job) -> None:
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while True:
+            if not job.leader_only:
+                await self._run_once(job)
+                await asyncio.sleep(job.next_delay())
+                continue
+            try:
+                leader = await self._ensure_leader()
+            except Exception:
+                logger.exception("Scheduler leader check failed")
+                leader = False
+            if not leader:
+                await asyncio.sleep(min(job.interval, self.leader_retry))
+                continue
+            await self._run_once(job)
+            await asyncio.sleep(job.next_delay())
+
+    async def _run_once(self, job: Job) -> None:
+        t0 = time.perf_counter()
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = repr(e)
+            logger.exception("Job %s failed", job.name)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            job.runs += 1
+            job.total_ms += ms
+            job.last_ms = ms
+            job.max_ms = max(job.max_ms, ms)
+            job.last_run_at = time.time()
@@ -0,0 +1,326 @@
+"""
+Очередь исходящих сообщений: все send/edit боёв идут через неё, а не вызовами Bot из хендлеров.
+- Лимиты Telegram: общий token bucket (SEND_GLOBAL_RATE сообщений/сек на процесс) и свой bucket на чат
+  (SEND_CHAT_RATE/сек, запас SEND_CHAT_BURST). При нескольких процессах общий лимит делится между ними.
+- У каждого чата своя очередь (FIFO): сообщения чата уходят строго в порядке постановки, и в чат одновременно
+  летит не больше одного запроса. Полосы приоритета выбирают между чатами: чат, у которого первым ждёт
+  BATTLE (ходы и итоги боёв), обслуживается раньше чата с MENU.
+- 429 (TelegramRetryAfter): чат ставится на паузу на retry_after, сообщение остаётся первым в очереди чата.
+- Правка сообщения, которая ещё не отправлена, заменяется более новой правкой того же сообщения (coalescing):
+  до игрока доходит только последнее состояние, а ждущие обеих правок получают один результат.
+Вызовы не блокируют друг друга: рассылка двум бойцам — два enqueue, доставка идёт параллельно.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета (меньше — раньше)
+BATTLE = 0
+MENU = 1
+
+
+class TokenBucket:
+    """rate токенов/сек, не больше burst; block(seconds) — пауза после 429."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до свободного токена (0 — можно отправлять)."""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "message_id", "kwargs", "fallback_send", "futures", "attempts")
+
+    def __init__(self, priority: int, seq: int, chat_id: int, message_id: Optional[int], kwargs: dict, fallback_send: bool):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.message_id = message_id  # None — send_message, иначе edit_message_text
+        self.kwargs = kwargs
+        self.fallback_send = fallback_send
+        self.futures: list[asyncio.Future] = []
+        self.attempts = 0
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def key(self) -> Optional[tuple[int, int]]:
+        return (self.chat_id, self.message_id) if self.message_id is not None else None
+
+    def resolve(self, result: Any) -> None:
+        for fut in self.futures:
+            if not fut.done():
+                fut.set_result(result)
+
+    def fail(self, exc: BaseException) -> None:
+        for fut in self.futures:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def cancel(self) -> None:
+        for fut in self.futures:
+            fut.cancel()
+
+
+class OutboundSender:
+    def __init__(
+        self, global_rate: float = 25.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+        max_in_flight: int = 20, max_retries: int = 3, max_retry_after: float = 60.0,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int, TokenBucket] = {}
+        self._max_in_flight = max_in_flight
+        self._bot: Optional[Bot] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None  # первые сообщения готовых чатов
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._seq = itertools.count()
+        self._edits: dict[tuple[int, int], _Job] = {}  # ещё не начатые правки — для coalescing
+        self._chat_jobs: dict[int, deque[_Job]] = {}  # очередь каждого чата, первое сообщение — следующее к отправке
+        self._busy: set[int] = set()  # чаты в _queue, с запросом в полёте или ждущие токена
+        self._tasks: set[asyncio.Task] = set()
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._slots = asyncio.Semaphore(self._max_in_flight)
+        self._runner = asyncio.create_task(self._run(), name="sender")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Дождаться отправки очереди (не дольше timeout), затем остановить; неотправленное отменяется."""
+        if self._runner is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._chat_jobs or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        for jobs in self._chat_jobs.values():
+            for job in jobs:
+                job.cancel()
+        self._chat_jobs.clear()
+        self._busy.clear()
+        self._edits.clear()
+
+    async def send(self, chat_id: int, text: str, *, priority: int = MENU, **kwargs) -> Message:
+        """send_message через очередь; kwargs — как у Bot.send_message (reply_markup, parse_mode...)."""
+        job = _Job(priority, next(self._seq), chat_id, None, {"text": text, **kwargs}, False)
+        return await self._submit(job)
+
+    async def edit(
+        self, chat_id: int, message_id: int, text: str, *, priority: int = BATTLE,
+        fallback_send: bool = True, **kwargs,
+    ) -> Optional[int]:
+        """
+        edit_message_text через очередь (с заменой неотправленной правки того же сообщения).
+        Если сообщение нельзя отредактировать и fallback_send — текст уходит новым сообщением,
+        возвращается его message_id (иначе None). Без fallback_send ошибка правки пробрасывается.
+        """
+        if self._runner is None:
+            raise RuntimeError("OutboundSender is not started")
+        job = _Job(priority, next(self._seq), chat_id, message_id, {"text": text, **kwargs}, fallback_send)
+        pending = self._edits.get(job.key)
+        if pending is not None:
+            pending.kwargs = job.kwargs
+            pending.fallback_send = pending.fallback_send or fallback_send
+            self.coalesced += 1
+            fut = asyncio.get_running_loop().create_future()
+            pending.futures.append(fut)
+            return await fut
+        self._edits[job.key] = job
+        return await self._submit(job)
+
+    async def edit_message(self, message: Message, text: str, **kwargs) -> Optional[int]:
+        """edit() для сообщения из апдейта (callback.message)."""
+        return await self.edit(message.chat.id, message.message_id, text, **kwargs)
+
+    async def _submit(self, job: _Job) -> Any:
+        if self._runner is None:
+            raise RuntimeError("OutboundSender is not started")
+        fut = asyncio.get_running_loop().create_future()
+        job.futures.append(fut)
+        self._chat_jobs.setdefault(job.chat_id, deque()).append(job)
+        if job.chat_id not in self._busy:
+            self._schedule(job.chat_id)
+        return await fut
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                now = time.monotonic()
+                self._chats = {c: b for c, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _schedule(self, chat_id: int) -> None:
+        """Поставить чат в общую очередь его первым сообщением; чат без сообщений освобождается."""
+        jobs = self._chat_jobs.get(chat_id)
+        if not jobs:
+            self._chat_jobs.pop(chat_id, None)
+            self._busy.discard(chat_id)
+            return
+        self._busy.add(chat_id)
+        self._queue.put_nowait(jobs[0])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            now = time.monotonic()
+            bucket = self._bucket(job.chat_id)
+            wait = bucket.delay(now)
+            if wait > 0:
+                # Не держим очередь ради одного чата: вернём чат, когда у него появится токен;
+                # сообщение остаётся первым в очереди чата
+                loop.call_later(wait, self._schedule, job.chat_id)
+                continue
+            wait = self._global.delay(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                now = time.monotonic()
+            self._global.take(now)
+            bucket.take(now)
+            await self._slots.acquire()
+            self._chat_jobs[job.chat_id].popleft()
+            if job.key is not None and self._edits.get(job.key) is job:
+                del self._edits[job.key]
+            task = asyncio.create_task(self._deliver(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, job: _Job) -> Any:
+        if job.message_id is None:
+            message = await self._bot.send_message(job.chat_id, **job.kwargs)
+            self.sent += 1
+            return message
+        try:
+            await self._bot.edit_message_text(chat_id=job.chat_id, message_id=job.message_id, **job.kwargs)
+            self.edited += 1
+            return None
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                return None
+            if not job.fallback_send:
+                raise
+        message = await self._bot.send_message(job.chat_id, **job.kwargs)
+        self.sent += 1
+        return message.message_id
+
+    async def _deliver(self, job: _Job) -> None:
+        try:
+            result = await self._call(job)
+        except TelegramRetryAfter as e:
+            self.retried += 1
+            self._bucket(job.chat_id).block(e.retry_after)
+            if job.attempts < self.max_retries and e.retry_after <= self.max_retry_after:
+                job.attempts += 1
+                self._retry(job)
+            else:
+                self.failed += 1
+                job.fail(e)
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            job.fail(e)
+        else:
+            job.resolve(result)
+        finally:
+            self._slots.release()
+            self._schedule(job.chat_id)
+
+    def _retry(self, job: _Job) -> None:
+        """
+        Повтор после 429 — снова первым в очереди чата; если за это время пришла новая правка того же
+        сообщения — отдаём ждущих ей.
+        """
+        newer = self._edits.get(job.key) if job.key is not None else None
+        if newer is not None:
+            newer.futures.extend(job.futures)
+            return
+        if job.key is not None:
+            self._edits[job.key] = job
+        self._chat_jobs.setdefault(job.chat_id, deque()).appendleft(job)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self._chat_jobs.values()),
+            "in_flight": len(self._tasks),
+            "sent": self.sent,
+            "edited": self.edited,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def build_sender() -> OutboundSender:
+    return OutboundSender(
+        global_rate=float(os.getenv("SEND_GLOBAL_RATE", "25")),
+        chat_rate=float(os.getenv("SEND_CHAT_RATE", "1")),
+        chat_burst=float(os.getenv("SEND_CHAT_BURST", "3")),
+        max_in_flight=int(os.getenv("SEND_MAX_IN_FLIGHT", "20")),
+    )
+
+
+sender = build_sender()
@@ -0,0 +1,230 @@
+"""
+Монте-Карло боёв арены пачками на NumPy — для баланса классов и предметов без живых боёв.
+Правила обмена ударами те же, что в BattleMath.resolve_round: блок зоной (+ block_bonus), крит пробивает блок,
+уворот, урон оружия + STR*0.5, броня armor/(armor+50), крит x1.5 с игнором 50% брони, минимум 1 урона.
+Бой — раунды до нуля HP у кого-то (двойной нокаут — победа второго, как в commit_arena_round); зелья не пьются.
+Зоны выбираются по политике — вероятностям зон 1..3 (по умолчанию равномерно, как «Автобой»).
+
+NumPy — в requirements.txt; без него модуль всё же импортируется, а simulate_* падают с подсказкой.
+Статы бойцов — CombatStats (скаляры на всю пачку) или dict массивов длины n (свой боец в каждом бою).
+"""
+from typing import Iterable, Mapping, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy нужен только для симуляций
+    np = None
+
+from services.game_math import BattleMath, CombatStats
+
+ZONES = 3
+# Исходы обмена (outcome в simulate_rounds)
+BLOCK, DODGE, HIT, CRIT = 0, 1, 2, 3
+
+_STAT_KEYS = ("strength", "agility", "intuition", "weapon_min", "weapon_max", "armor", "crit_bonus", "block_bonus")
+
+Fighter = Union[CombatStats, Mapping[str, "np.ndarray"]]
+# Вероятности зон 1..3: (3,) — одна на всю пачку, (n, 3) — своя в каждом бою
+Policy = Optional[Sequence[float]]
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("services.simulator needs numpy: pip install numpy")
+
+
+def fighter(
+    player_class: Optional[str], level: int, items: Iterable[dict] = (),
+    strength: int = 1, agility: int = 1, intuition: int = 1, stamina: int = 1,
+) -> CombatStats:
+    """
+    Боец с надетыми предметами (строки как в _INITIAL_ITEMS / каталоге): суммы bonus_str и брони,
+    первое оружие с уроном, полный сет head+body+legs — как _derive_combat_stats в Database.
+    """
+    items = list(items)
+    strength = strength + sum(i.get("bonus_str") or 0 for i in items)
+    worn = [i for i in items if i.get("slot") in ("head", "body", "legs")]
+    weapon = next(
+        (i for i in items if i.get("slot") == "weapon" and (i.get("min_damage") or i.get("max_damage"))), None
+    )
+    derived = BattleMath.class_stats(
+        player_class, level, strength, agility, stamina,
+        sum(i.get("armor") or 0 for i in worn), len({i["slot"] for i in worn}) >= 3,
+        (weapon.get("min_damage") or 0) if weapon else 0,
+        (weapon.get("max_damage") or 0) if weapon else 0,
+        (weapon.get("class_type") or "all") if weapon else None,
+    )
+    stats: CombatStats = {
+        "strength": strength, "agility": agility, "intuition": intuition, "stamina": stamina, "level": level,
+        **derived,
+    }
+    stats["hp"] = stats["max_hp"]
+    return stats
+
+
+def best_loadout(items: Iterable[dict], player_class: Optional[str], level: int) -> list[dict]:
+    """Лучшее доступное на уровне: оружие своего класса (или 'all') с наибольшим средним уроном + броня по слотам."""
+    usable = [
+        i for i in items
+        if (i.get("min_level") or 1) <= level and (i.get("class_type") or "all") in ("all", player_class)
+    ]
+    loadout = []
+    weapons = [i for i in usable if i.get("slot") == "weapon"]
+    if weapons:
+        loadout.append(max(weapons, key=lambda i: ((i.get("min_damage") or 0) + (i.get("max_damage") or 0), i.get("price") or 0)))
+    for slot in ("head", "body", "legs"):
+        worn = [i for i in usable if i.get("slot") == slot]
+        if worn:
+            loadout.append(max(worn, key=lambda i: (i.get("armor") or 0, i.get("bonus_str") or 0, i.get("price") or 0)))
+    return loadout
+
+
+def _arrays(stats: Fighter) -> dict:
+    """Статы бойца -> массивы float64 (0-мерные для скаляров — NumPy растянет их на пачку)."""
+    out = {k: np.asarray(stats.get(k, 0) or 0, dtype=np.float64) for k in _STAT_KEYS}
+    hp = stats.get("hp")
+    out["hp"] = np.asarray(stats.get("max_hp", 0) if hp is None else hp, dtype=np.float64)
+    return out
+
+
+def _take(arr: "np.ndarray", idx: "np.ndarray") -> "np.ndarray":
+    return arr[idx] if arr.ndim else arr
+
+
+def _zones(rng: "np.random.Generator", policy: Policy, idx: "np.ndarray") -> "np.ndarray":
+    if policy is None:
+        return rng.integers(1, ZONES + 1, size=idx.size)
+    p = np.asarray(policy, dtype=np.float64)
+    cum = np.cumsum(p / p.sum(axis=-1, keepdims=True), axis=-1)
+    if cum.ndim > 1:
+        cum = cum[idx]
+    u = rng.random(idx.size)
+    return 1 + (u[:, None] >= cum[..., :-1]).sum(axis=1)
+
+
+def _exchange(
+    rng: "np.random.Generator", att: dict, dfn: dict, atk_zone: "np.ndarray", blk_zone: "np.ndarray", idx: "np.ndarray",
+) -> tuple["np.ndarray", "np.ndarray"]:
+    """Удары att по dfn в боях idx: (урон, исход BLOCK/DODGE/HIT/CRIT)."""
+    n = idx.size
+    block_bonus = _take(dfn["block_bonus"], idx)
+    blocked = atk_zone == blk_zone
+    blocked |= (block_bonus > 0) & (rng.random(n) * 100 < block_bonus)
+
+    w_min = _take(att["weapon_min"], idx)
+    w_max = np.maximum(_take(att["weapon_max"], idx), w_min)
+    base = rng.integers(w_min.astype(np.int64), w_max.astype(np.int64) + 1, size=n) + _take(att["strength"], idx) * 0.5
+
+    crit_chance = np.clip(_take(att["intuition"], idx) * 0.5, 0, 100) + _take(att["crit_bonus"], idx)
+    crit = rng.random(n) * 100 < crit_chance
+    dodge = rng.random(n) * 100 < np.clip(_take(dfn["agility"], idx) * 0.5, 0, 100)
+
+    armor = np.broadcast_to(_take(dfn["armor"], idx), (n,))
+    effective = np.where(crit, armor * 0.5, armor)
+    reduction = np.where(armor > 0, effective / (effective + 50), 0.0)
+    dmg = base * (1 - reduction) * np.where(crit, 1.5, 1.0)
+    # round() в Python — банковское округление, np.rint — тоже
+    dmg = np.maximum(1, np.rint(dmg)).astype(np.int64)
+
+    outcome = np.where(crit, CRIT, HIT)
+    outcome = np.where(blocked & ~crit, BLOCK, np.where(dodge, DODGE, outcome))
+    dmg = np.where(outcome >= HIT, dmg, 0)
+    return dmg, outcome
+
+
+def simulate_rounds(
+    p1: Fighter, p2: Fighter, n: int, policy1: Policy = None, policy2: Policy = None, seed: Optional[int] = None,
+) -> dict:
+    """n независимых раундов: урон и исходы обмена в обе стороны (массивы длины n)."""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    a1, a2 = _arrays(p1), _arrays(p2)
+    idx = np.arange(n)
+    atk1, blk1 = _zones(rng, policy1, idx), _zones(rng, policy1, idx)
+    atk2, blk2 = _zones(rng, policy2, idx), _zones(rng, policy2, idx)
+    dmg12, out12 = _exchange(rng, a1, a2, atk1, blk2, idx)
+    dmg21, out21 = _exchange(rng, a2, a1, atk2, blk1, idx)
+    return {"dmg1_to_2": dmg12, "dmg2_to_1": dmg21, "outcome1": out12, "outcome2": out21}
+
+
+def simulate_fights(
+    p1: Fighter, p2: Fighter, n: int, policy1: Policy = None, policy2: Policy = None,
+    max_rounds: int = 200, seed: Optional[int] = None,
+) -> dict:
+    """
+    n боёв до победы (или max_rounds): доли побед, длина боя, распределение урона за обмен.
+    Раунд считается сразу для всех ещё идущих боёв — стоимость ~ n * средняя длина боя операций NumPy.
+    """
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    a1, a2 = _arrays(p1), _arrays(p2)
+    hp1 = np.broadcast_to(a1["hp"], (n,)).astype(np.int64)
+    hp2 = np.broadcast_to(a2["hp"], (n,)).astype(np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    hist12 = np.zeros(1, dtype=np.int64)
+    hist21 = np.zeros(1, dtype=np.int64)
+
+    active = np.arange(n)
+    for r in range(1, max_rounds + 1):
+        if active.size == 0:
+            break
+        atk1, blk1 = _zones(rng, policy1, active), _zones(rng, policy1, active)
+        atk2, blk2 = _zones(rng, policy2, active), _zones(rng, policy2, active)
+        dmg12, _ = _exchange(rng, a1, a2, atk1, blk2, active)
+        dmg21, _ = _exchange(rng, a2, a1, atk2, blk1, active)
+        hp1[active] -= dmg21
+        hp2[active] -= dmg12
+        rounds[active] = r
+        hist12 = _add_hist(hist12, dmg12)
+        hist21 = _add_hist(hist21, dmg21)
+        active = active[(hp1[active] > 0) & (hp2[active] > 0)]
+
+    finished = (hp1 <= 0) | (hp2 <= 0)
+    p2_won = hp1 <= 0
+    p1_won = finished & ~p2_won
+    done_rounds = rounds[finished]
+    return {
+        "fights": n,
+        "p1_win_rate": float(p1_won.mean()) if n else 0.0,
+        "p2_win_rate": float(p2_won.mean()) if n else 0.0,
+        "double_ko_rate": float(((hp1 <= 0) & (hp2 <= 0)).mean()) if n else 0.0,
+        "unfinished": int(n - finished.sum()),
+        "rounds_mean": float(done_rounds.mean()) if done_rounds.size else 0.0,
+        "rounds_p50": float(np.percentile(done_rounds, 50)) if done_rounds.size else 0.0,
+        "rounds_p90": float(np.percentile(done_rounds, 90)) if done_rounds.size else 0.0,
+        "rounds_max": int(done_rounds.max()) if done_rounds.size else 0,
+        "dmg1_mean": _hist_mean(hist12),
+        "dmg2_mean": _hist_mean(hist21),
+        # hist[d] — сколько обменов нанесли ровно d урона (0 — блок или уворот)
+        "dmg1_hist": hist12.tolist(),
+        "dmg2_hist": hist21.tolist(),
+        "hp1_left_mean": float(np.maximum(hp1, 0)[p1_won].mean()) if p1_won.any() else 0.0,
+        "hp2_left_mean": float(np.maximum(hp2, 0)[p2_won].mean()) if p2_won.any() else 0.0,
+    }
+
+
+def _add_hist(hist: "np.ndarray", dmg: "np.ndarray") -> "np.ndarray":
+    counts = np.bincount(dmg)
+    if counts.size > hist.size:
+        hist = np.pad(hist, (0, counts.size - hist.size))
+    hist[: counts.size] += counts
+    return hist
+
+
+def _hist_mean(hist: "np.ndarray") -> float:
+    total = hist.sum()
+    return float((hist * np.arange(hist.size)).sum() / total) if total else 0.0
+
+
+def win_matrix(fighters: Mapping[str, Fighter], n: int, seed: Optional[int] = None, **kwargs) -> dict[str, dict[str, dict]]:
+    """Все пары (включая зеркало): matrix[a][b] — отчёт simulate_fights для a (p1) против b (p2)."""
+    _require_numpy()
+    seeds = np.random.SeedSequence(seed).spawn(len(fighters) ** 2)
+    matrix: dict[str, dict[str, dict]] = {}
+    k = 0
+    for a, fa in fighters.items():
+        matrix[a] = {}
+        for b, fb in fighters.items():
+            matrix[a][b] = simulate_fights(fa, fb, n, seed=seeds[k], **kwargs)
+            k += 1
+    return matrix
@@ -0,0 +1,174 @@
+"""
+Хранилище короткоживущего состояния хендлеров (выбор зон атаки/защиты до подтверждения хода).
+Записи живут STATE_TTL секунд, поэтому брошенные бои не копят память.
+STATE_STORE=memory (по умолчанию) — LRU в процессе с лимитом STATE_MAX_ENTRIES;
+STATE_STORE=postgres — UNLOGGED-таблица move_state (миграция 8), общая для всех процессов бота.
+Значение — плоский dict; merge() атомарно дописывает поля, так что быстрые нажатия не теряют друг друга.
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from database.db import db
+
+
+class StateStore(ABC):
+    """Интерфейс: get / merge / delete / purge_expired / stats."""
+
+    # True — состояние общее для процессов (очистку достаточно делать лидеру планировщика)
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def merge(self, key: str, fields: dict) -> dict:
+        """Дописать поля (создать запись при отсутствии), продлить TTL; вернуть итоговое значение."""
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def purge_expired(self) -> int:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, ttl: float = 900.0, maxsize: int = 50000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key: str) -> Optional[dict]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self._live(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(value)
+
+    async def merge(self, key: str, fields: dict) -> dict:
+        value = {**(self._live(key) or {}), **fields}
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return dict(value)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+        for k in expired:
+            del self._data[k]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class PostgresStateStore(StateStore):
+    """Таблица move_state (key, value JSONB, expires_at); просроченное не читается и удаляется purge_expired."""
+
+    shared = True
+
+    def __init__(self, database, ttl: float = 900.0):
+        self.db = database
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        async with self.db.pool.acquire() as conn:
+            value = await conn.fetchval(
+                "SELECT value FROM move_state WHERE key = $1 AND expires_at > NOW()", key
+            )
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    async def merge(self, key: str, fields: dict) -> dict:
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                INSERT INTO move_state (key, value, expires_at)
+                VALUES ($1, $2, NOW() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE SET
+                    value = CASE WHEN move_state.expires_at > NOW() THEN move_state.value || EXCLUDED.value
+                                 ELSE EXCLUDED.value END,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING value
+                """,
+                key, fields, self.ttl,
+            )
+
+    async def delete(self, key: str) -> None:
+        async with self.db.pool.acquire() as conn:
+            await conn.execute("DELETE FROM move_state WHERE key = $1", key)
+
+    async def purge_expired(self) -> int:
+        async with self.db.pool.acquire() as conn:
+            status = await conn.execute("DELETE FROM move_state WHERE expires_at <= NOW()")
+        removed = int(status.split()[-1])
+        self.expirations += removed
+        return removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "postgres",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "expirations": self.expirations,
+        }
+
+
+def build_state_store() -> StateStore:
+    ttl = float(os.getenv("STATE_TTL", "900"))
+    if os.getenv("STATE_STORE", "memory") == "postgres":
+        return PostgresStateStore(db, ttl)
+    return MemoryStateStore(ttl, int(os.getenv("STATE_MAX_ENTRIES", "50000")))
+
+
+state_store = build_state_store()
@@ -0,0 +1,211 @@
+"""
+Точный шанс победы в бою арены: динамика по состояниям (hp1, hp2) на формулах BattleMath.
+За обмен ударами урон — дискретное распределение (блок зоной 1/3 при случайных зонах + block_bonus,
+крит пробивает блок, уворот, равномерный ролл оружия, final_damage); два обмена раунда независимы.
+W(h1, h2) — вероятность победы первого, E(h1, h2) — ожидаемое число раундов; двойной нокаут — победа второго
+(как в commit_arena_round). Раунд «оба по нулю» — петля, делится на (1 - q0).
+
+Строка h1 таблицы = свёртка уже посчитанных строк h1-b с распределением урона по h2 (np.convolve)
++ рекуррентность внутри строки (удары только по второму), решённая свёрткой с её импульсным откликом.
+Таблица на пару снапшотов статов считается один раз (до их MaxHP) и отвечает на любое HP по ходу боя:
+WinSolver держит LRU таблиц (WIN_SOLVER_CACHE). Зелья и бинты модель не учитывает — шанс пересчитывается
+по фактическому HP после них. numpy — в requirements.txt; если его нет, solver недоступен (available = False), шанс не показывается,
+а main.py пишет об этом предупреждение при старте.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - без numpy шанс победы не показывается
+    np = None
+
+from services.game_math import BattleMath, CombatStats
+
+# Вероятность, что случайная атака попала в случайно выбранную зону защиты (3 зоны)
+ZONE_BLOCK = 1 / 3
+
+# Поля снапшота, от которых зависит распределение урона (+ MaxHP — размер таблицы)
+_KEY_FIELDS = ("strength", "agility", "intuition", "weapon_min", "weapon_max", "armor", "crit_bonus", "block_bonus")
+
+
+def damage_distribution(att: CombatStats, dfn: CombatStats) -> dict[int, float]:
+    """Урон att по dfn за один обмен: {урон: вероятность}, 0 — блок или уворот."""
+    block_bonus = min(100.0, max(0.0, dfn.get("block_bonus", 0) or 0)) / 100
+    blocked = ZONE_BLOCK + (1 - ZONE_BLOCK) * block_bonus
+    crit_chance = BattleMath.crit_chance(att.get("intuition", 0)) + (att.get("crit_bonus", 0) or 0)
+    crit = min(1.0, max(0.0, crit_chance / 100))
+    dodge = BattleMath.dodge_chance(dfn.get("agility", 0)) / 100
+    # Блок без крита — удара нет; иначе (крит или не заблокировано) ещё может быть уворот
+    stopped = blocked * (1 - crit)
+    dist: dict[int, float] = {0: stopped + (1 - stopped) * dodge}
+
+    w_min = att.get("weapon_min", 0) or 0
+    w_max = max(att.get("weapon_max", 0) or 0, w_min)
+    rolls = range(w_min, w_max + 1)
+    p_hit = (1 - blocked) * (1 - crit) * (1 - dodge) / len(rolls)
+    p_crit = crit * (1 - dodge) / len(rolls)
+    armor = dfn.get("armor", 0) or 0
+    for w in rolls:
+        base = w + att.get("strength", 0) * 0.5
+        for is_crit, p in ((False, p_hit), (True, p_crit)):
+            if p > 0:
+                dmg = BattleMath.final_damage(base, armor, is_crit=is_crit)
+                dist[dmg] = dist.get(dmg, 0.0) + p
+    return dist
+
+
+class WinTable:
+    """W и E для всех 0 < hp1 <= H1, 0 < hp2 <= H2 одной пары снапшотов."""
+
+    __slots__ = ("win", "rounds")
+
+    def __init__(self, win: "np.ndarray", rounds: "np.ndarray"):
+        self.win = win
+        self.rounds = rounds
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.win.shape[0] - 1, self.win.shape[1] - 1
+
+    def lookup(self, hp1: int, hp2: int) -> tuple[float, float]:
+        """(шанс победы первого, ожидаемое число раундов) при текущем HP."""
+        if hp1 <= 0:
+            return 0.0, 0.0
+        if hp2 <= 0:
+            return 1.0, 0.0
+        return float(self.win[hp1, hp2]), float(self.rounds[hp1, hp2])
+
+
+def _as_array(dist: dict[int, float]) -> "np.ndarray":
+    out = np.zeros(max(dist) + 1)
+    for dmg, p in dist.items():
+        out[dmg] += p
+    return out
+
+
+def solve_table(s1: CombatStats, s2: CombatStats, h1: int, h2: int) -> WinTable:
+    """Таблица W/E до (h1, h2) включительно."""
+    if np is None:
+        raise RuntimeError("services.win_solver needs numpy: pip install numpy")
+    p12 = _as_array(damage_distribution(s1, s2))  # урон первого по второму
+    p21 = _as_array(damage_distribution(s2, s1))
+    d12, d21 = p12.size - 1, p21.size - 1
+    q0 = p12[0] * p21[0]
+    stay = 1 - q0
+    win = np.zeros((h1 + 1, h2 + 1))
+    rounds = np.zeros((h1 + 1, h2 + 1))
+    if stay < 1e-12:
+        # Никто никогда не наносит урона: бой не кончается
+        rounds[1:, 1:] = np.inf
+        return WinTable(win, rounds)
+
+    # Строки с «хвостом» слева: столбец c = h2 + d12, h2 <= 0 — второй уже лёг (W = 1, E = 0)
+    width = h2 + d12 + 1
+    win_rows = np.zeros((h1 + 1, width))
+    rounds_rows = np.zeros((h1 + 1, width))
+    win_rows[1:, : d12 + 1] = 1.0
+    # Вероятность, что удар по второму на HP h2 его добивает: P(a >= h2)
+    tail = np.concatenate((np.cumsum(p12[::-1])[::-1], np.zeros(max(0, h2 + 1 - p12.size))))[1 : h2 + 1]
+    # Импульсный отклик рекуррентности внутри строки: y[n] = x[n] + sum_a c_a * y[n - a]
+    c = p21[0] * p12 / stay
+    g = np.zeros(h2)
+    if h2:
+        g[0] = 1.0
+        for n in range(1, h2):
+            k = min(n, d12)
+            g[n] = np.dot(c[1 : k + 1], g[n - 1 :: -1][:k])
+
+    for r in range(1, h1 + 1):
+        lo = max(0, r - d21)
+        # Ряды r-b (b >= 1), веса p21[b]; ряды ниже 1 — первый лёг (W = 0, E = 0)
+        weights = p21[r - np.arange(lo, r)][:, None]
+        prev_win = (weights * win_rows[lo:r]).sum(axis=0)
+        prev_rounds = (weights * rounds_rows[lo:r]).sum(axis=0)
+        x_win = np.convolve(prev_win, p12)[d12 + 1 : d12 + h2 + 1] + p21[0] * tail
+        x_rounds = 1.0 + np.convolve(prev_rounds, p12)[d12 + 1 : d12 + h2 + 1]
+        win_rows[r, d12 + 1 :] = np.convolve(x_win / stay, g)[:h2]
+        rounds_rows[r, d12 + 1 :] = np.convolve(x_rounds / stay, g)[:h2]
+
+    win[1:, 1:] = win_rows[1:, d12 + 1 :]
+    rounds[1:, 1:] = rounds_rows[1:, d12 + 1 :]
+    # Хранятся float32: таблица 370x370 (танк против танка на 5 уровне) — ~1 МБ
+    return WinTable(np.clip(win, 0.0, 1.0).astype(np.float32), rounds.astype(np.float32))
+
+
+def _key(stats: CombatStats) -> tuple:
+    return tuple(stats.get(k, 0) or 0 for k in _KEY_FIELDS)
+
+
+class WinSolver:
+    """Таблицы W/E по паре снапшотов статов с LRU-вытеснением; расчёт при промахе — в отдельном потоке."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._tables: OrderedDict[tuple, WinTable] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def _cache_key(self, s1: CombatStats, s2: CombatStats, hp1: int, hp2: int) -> tuple[tuple, int, int]:
+        h1 = max(int(s1.get("max_hp") or 0), hp1)
+        h2 = max(int(s2.get("max_hp") or 0), hp2)
+        return (_key(s1), _key(s2), h1, h2), h1, h2
+
+    def _cached(self, key: tuple) -> Optional[WinTable]:
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            self.hits += 1
+        return table
+
+    def _store(self, key: tuple, table: WinTable) -> None:
+        self.misses += 1
+        self._tables[key] = table
+        self._tables.move_to_end(key)
+        while len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+
+    def solve(self, s1: CombatStats, s2: CombatStats, hp1: Optional[int] = None, hp2: Optional[int] = None) -> tuple[float, float]:
+        """(шанс победы s1, ожидаемое число раундов) при hp1/hp2 (по умолчанию — MaxHP)."""
+        hp1 = int(s1.get("max_hp") or 0) if hp1 is None else int(hp1)
+        hp2 = int(s2.get("max_hp") or 0) if hp2 is None else int(hp2)
+        key, h1, h2 = self._cache_key(s1, s2, hp1, hp2)
+        table = self._cached(key)
+        if table is None:
+            table = solve_table(s1, s2, h1, h2)
+            self._store(key, table)
+        return table.lookup(hp1, hp2)
+
+    async def win_chance(
+        self, s1: CombatStats, s2: CombatStats, hp1: Optional[int] = None, hp2: Optional[int] = None,
+    ) -> Optional[tuple[float, float]]:
+        """solve() без блокировки event loop на промахе; None — numpy не установлен."""
+        if not self.available:
+            return None
+        hp1 = int(s1.get("max_hp") or 0) if hp1 is None else int(hp1)
+        hp2 = int(s2.get("max_hp") or 0) if hp2 is None else int(hp2)
+        key, h1, h2 = self._cache_key(s1, s2, hp1, hp2)
+        table = self._cached(key)
+        if table is None:
+            table = await asyncio.to_thread(solve_table, s1, s2, h1, h2)
+            self._store(key, table)
+        return table.lookup(hp1, hp2)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "available": self.available,
+            "size": len(self._tables),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+win_solver = WinSolver(int(os.getenv("WIN_SOLVER_CACHE", "256")))